@@ -1,6 +1,9 @@
 import os
-import google.generativeai as genai
+import threading
+import time
 from dotenv import load_dotenv
+import metrics
+import profile_cache
 
 load_dotenv()
 
@@ -9,21 +12,87 @@ api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     print("Warning: GEMINI_API_KEY not found in .env")
 
-genai.configure(api_key=api_key)
+# The Gemini SDK (and its grpc/protobuf stack) takes about a second to import,
+# so it is loaded on the first real AI call instead of at startup.
+_model = None
+_model_lock = threading.Lock()
 
-def generate_psychological_profile(pgn_list: list, stats: dict) -> str:
-    """
-    Sends chess data to Gemini and returns a text-based psychological profile.
-    """
-    if not pgn_list:
-        return "Not enough games to generate a profile."
+def _get_model():
+    """Imports and configures the Gemini SDK on first use, then reuses the model."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=api_key)
+                _model = genai.GenerativeModel('gemini-flash-latest')
+    return _model
 
-    # 1. Initialize the Model
-    model = genai.GenerativeModel('gemini-flash-latest')
+# AI_BACKEND: "gemini" (default) or "stub", a local fake for tests and benchmarks
+AI_BACKEND = os.getenv("AI_BACKEND", "gemini")
+AI_STUB_LATENCY_SECONDS = float(os.getenv("AI_STUB_LATENCY_SECONDS", 0))
+# Upper bound on one Gemini request, so a hung call fails instead of blocking forever
+AI_REQUEST_TIMEOUT_SECONDS = float(os.getenv("AI_REQUEST_TIMEOUT_SECONDS", 60))
 
-    # 2. Construct the Prompt (The "System Persona")
-    # We give the AI a role and the data.
-    prompt = f"""
+# --- Profile Cache ---
+# Identical prompt inputs return the cached profile instead of calling Gemini again.
+# AI_CACHE_BACKEND: "memory" (default), "database" (see main.py) or "none"
+AI_CACHE_BACKEND = os.getenv("AI_CACHE_BACKEND", "memory")
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", 256))
+AI_CACHE_TTL_SECONDS = int(os.getenv("AI_CACHE_TTL_SECONDS", 3600))
+
+cache = None
+if AI_CACHE_BACKEND == "memory":
+    cache = profile_cache.MemoryProfileCache(
+        max_entries=AI_CACHE_MAX_ENTRIES, ttl_seconds=AI_CACHE_TTL_SECONDS
+    )
+
+def set_cache(new_cache):
+    """Swaps the profile cache backend (or disables caching with None)."""
+    global cache
+    cache = new_cache
+
+def invalidate_user_profile(user_id: int):
+    """Drops any cached profile for a user, e.g. after they save a new game."""
+    if cache is not None:
+        cache.invalidate_user(user_id)
+
+def get_cached_profile(pgn_list: list, stats: dict):
+    """Returns the cached profile for these inputs without calling the AI, or None."""
+    if cache is None or not pgn_list:
+        return None
+    try:
+        return cache.get(profile_cache.make_cache_key(pgn_list[:3], stats))
+    except Exception as e:
+        print(f"AI Cache Error: {e}")
+        return None
+
+def _cache_profile(pgn_list: list, stats: dict, report: str, user_id: int = None):
+    """Stores a successfully generated profile."""
+    if cache is None:
+        return
+    try:
+        # Only the first three samples make it into the prompt
+        cache.set(profile_cache.make_cache_key(pgn_list[:3], stats), report, user_id=user_id)
+    except Exception as e:
+        print(f"AI Cache Error: {e}")
+
+def _stub_profile_text(stats: dict) -> str:
+    return (
+        f"[stub] Aggression {stats.get('aggressive_score')}, "
+        f"defence {stats.get('defensive_score')}."
+    )
+
+def _generate_stub_profile(stats: dict) -> str:
+    """Stands in for Gemini when AI_BACKEND=stub. Sleeps to mimic network latency."""
+    if AI_STUB_LATENCY_SECONDS:
+        time.sleep(AI_STUB_LATENCY_SECONDS)
+    return _stub_profile_text(stats)
+
+def _build_prompt(pgn_list: list, stats: dict) -> str:
+    """Builds the Gemini prompt from the scores and up to three sample games."""
+    # The "System Persona": we give the AI a role and the data.
+    return f"""
     You are an expert behavioral psychologist and a Chess Grandmaster. 
     You analyze how people play chess to determine their real-life personality traits.
 
@@ -41,10 +110,100 @@ def generate_psychological_profile(pgn_list: list, stats: dict) -> str:
     Keep it professional, insightful, and slightly dramatic. Do not mention "PGN" or technical terms.
     """
 
+def generate_psychological_profile(pgn_list: list, stats: dict, user_id: int = None, raise_errors: bool = False) -> str:
+    """
+    Sends chess data to Gemini and returns a text-based psychological profile.
+    Results are cached on a digest of the inputs; `user_id` lets a new game invalidate them.
+    AI errors (including timeouts) return an apology text, or are raised with `raise_errors`.
+    """
+    if not pgn_list:
+        return "Not enough games to generate a profile."
+
+    cached_report = get_cached_profile(pgn_list, stats)
+    if cached_report is not None:
+        return cached_report
+
+    prompt = _build_prompt(pgn_list, stats)
+
     try:
-        # 3. Call the API
-        response = model.generate_content(prompt)
-        return response.text
+        # Call the API (the model is created on first use)
+        with metrics.span("ai.generate"):
+            if AI_BACKEND == "stub":
+                report = _generate_stub_profile(stats)
+            else:
+                response = _get_model().generate_content(
+                    prompt, request_options={"timeout": AI_REQUEST_TIMEOUT_SECONDS}
+                )
+                report = response.text
     except Exception as e:
         print(f"AI Error: {e}")
-        return "Could not generate profile at this time. (AI Connection Error)"
\ No newline at end of file
+        if raise_errors:
+            raise
+        return "Could not generate profile at this time. (AI Connection Error)"
+
+    # Errors above are deliberately not cached, so the next request retries
+    _cache_profile(pgn_list, stats, report, user_id)
+    return report
+
+def _stream_stub_profile(stats: dict):
+    """Streaming stub: yields the stub profile word by word, spreading the latency."""
+    words = _stub_profile_text(stats).split(" ")
+    delay = AI_STUB_LATENCY_SECONDS / len(words)
+    for i, word in enumerate(words):
+        if delay:
+            time.sleep(delay)
+        yield word if i == 0 else " " + word
+
+def _cancel_stream(response):
+    """Cancels the SDK's underlying gRPC stream, if there is one still open."""
+    upstream = getattr(response, "_iterator", None)
+    cancel = getattr(upstream, "cancel", None)
+    if cancel is not None:
+        cancel()
+
+def stream_psychological_profile(pgn_list: list, stats: dict, user_id: int = None):
+    """
+    Streaming version of generate_psychological_profile: yields the report in chunks
+    as Gemini produces them. Closing the generator early (e.g. the client went away)
+    ends the upstream request. Only complete reports are cached.
+    """
+    if not pgn_list:
+        yield "Not enough games to generate a profile."
+        return
+
+    cached_report = get_cached_profile(pgn_list, stats)
+    if cached_report is not None:
+        yield cached_report
+        return
+
+    parts = []
+    start = time.perf_counter()
+    response = None
+    chunks = None
+    try:
+        if AI_BACKEND == "stub":
+            chunks = _stream_stub_profile(stats)
+        else:
+            response = _get_model().generate_content(
+                _build_prompt(pgn_list, stats),
+                stream=True,
+                request_options={"timeout": AI_REQUEST_TIMEOUT_SECONDS},
+            )
+            chunks = (chunk.text for chunk in response)
+        for text in chunks:
+            if not parts:
+                metrics.SPAN_LATENCY.observe(time.perf_counter() - start, "ai.first_chunk")
+            parts.append(text)
+            yield text
+    except Exception as e:
+        print(f"AI Error: {e}")
+        yield "Could not generate profile at this time. (AI Connection Error)"
+        return
+    finally:
+        # Also runs on close(): tear the stream down now instead of at garbage collection
+        if chunks is not None:
+            chunks.close()
+        _cancel_stream(response)
+
+    metrics.SPAN_LATENCY.observe(time.perf_counter() - start, "ai.generate")
+    _cache_profile(pgn_list, stats, "".join(parts), user_id)
@@ -0,0 +1,132 @@
+import io
+import chess
+import chess.pgn
+import move_codec
+import openings
+
+# --- Scoring Weights ---
+# These are the same weights the analysis has always used:
+# a capture is half an "aggressive" point, a check is a full point,
+# and castling counts as one "defensive" point.
+CAPTURE_WEIGHT = 0.5
+CHECK_WEIGHT = 1
+CASTLING_WEIGHT = 1
+
+
+def empty_features() -> dict:
+    """Features for a game that could not be parsed (or has no moves)."""
+    return {
+        "ply_count": 0,
+        "captures": 0,
+        "checks": 0,
+        "castles": 0,
+        "white_castling": None,
+        "black_castling": None,
+        "first_move_san": None,
+        "opening_eco": None,
+        "opening_name": None,
+    }
+
+
+def parse_pgn(pgn_moves: str):
+    """Parses a PGN string into a chess.pgn.Game, or returns None if that fails."""
+    try:
+        return chess.pgn.read_game(io.StringIO(pgn_moves))
+    except Exception as e:
+        print(f"Error parsing PGN: {e}")
+        return None
+
+
+def extract_features(pgn_moves: str) -> dict:
+    """
+    Parses a PGN string and returns its features (see extract_game_features).
+    """
+    game_data = parse_pgn(pgn_moves)
+    if game_data is None:
+        return empty_features()
+    return extract_game_features(game_data)
+
+
+def extract_game_features(game_data: chess.pgn.Game) -> dict:
+    """
+    Replays an already parsed game once and counts everything the analysis needs.
+    The result maps 1:1 onto the columns of models.GameFeatures.
+    """
+    return extract_board_features(game_data.board(), game_data.mainline_moves())
+
+
+def extract_packed_features(packed: bytes, start_fen: str = None) -> dict:
+    """Same as extract_game_features, but from move_codec's packed moves (no PGN parsing)."""
+    return extract_board_features(move_codec.start_board(start_fen), move_codec.decode_moves(packed))
+
+
+def extract_board_features(board: chess.Board, moves) -> dict:
+    """
+    Pushes `moves` onto `board` once and counts captures, checks, castling,
+    the first move and the ECO opening.
+    """
+    features = empty_features()
+    moves = list(moves)
+    # The ECO table only covers games from the standard starting position
+    if board.fen() == chess.STARTING_FEN:
+        features["opening_eco"], features["opening_name"] = openings.classify_moves(moves)
+    try:
+        for move in moves:
+            if features["first_move_san"] is None:
+                # Store first move for opening preference
+                features["first_move_san"] = board.san(move)
+
+            # --- Analyze BEFORE pushing the move ---
+            if board.is_capture(move):
+                features["captures"] += 1
+            if board.is_castling(move):
+                features["castles"] += 1
+                side = "kingside" if board.is_kingside_castling(move) else "queenside"
+                color = "white_castling" if board.turn == chess.WHITE else "black_castling"
+                features[color] = side
+
+            board.push(move)
+            features["ply_count"] += 1
+
+            # --- Analyze AFTER pushing the move ---
+            # Did this move put the opponent in check?
+            if board.is_check():
+                features["checks"] += 1
+    except Exception as e:
+        print(f"Error parsing PGN: {e}")
+
+    return features
+
+
+def aggressive_score(captures: float, checks: float) -> float:
+    """Aggression from capture/check counts (works on single games or sums)."""
+    return captures * CAPTURE_WEIGHT + checks * CHECK_WEIGHT
+
+
+def defensive_score(castles: float) -> float:
+    """Defensiveness from castling counts (works on single games or sums)."""
+    return castles * CASTLING_WEIGHT
+
+
+def classify_personality(aggressive_score: float, defensive_score: float):
+    """Maps the two scores to a (personality_type, celebrity_match) pair."""
+    if aggressive_score > (defensive_score * 1.5):
+        return "Aggressive Attacker", "Mikhail Tal"
+    if defensive_score > (aggressive_score * 1.5):
+        return "Solid Defender", "Tigran Petrosian"
+    return "Balanced", "Magnus Carlsen"
+
+
+def opening_label(features: dict):
+    """
+    What a game counts as in the opening distribution: its ECO opening name, or
+    its first move for games outside the table (None for games without moves).
+    """
+    return features["opening_name"] or features["first_move_san"]
+
+
+def most_common_opening(opening_counts: dict):
+    """Returns the most frequent entry of an {opening: count} histogram."""
+    if not opening_counts:
+        return "Varies"
+    return max(opening_counts, key=opening_counts.get)
@@ -0,0 +1,145 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+import analysis
+
+load_dotenv()
+
+# --- Multi-process Analysis Engine ---
+# Replaying moves is pure-Python and CPU-bound, so big collections are split
+# into chunks and replayed on a process pool. Small inputs stay inline, where
+# the cost of shipping PGNs to another process would outweigh the gain.
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+ANALYSIS_PARALLEL_MIN_GAMES = int(os.getenv("ANALYSIS_PARALLEL_MIN_GAMES", 500))
+ANALYSIS_CHUNK_SIZE = int(os.getenv("ANALYSIS_CHUNK_SIZE", 250))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Creates the process pool on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # "spawn" avoids forking a process that already runs server threads
+            _executor = ProcessPoolExecutor(
+                max_workers=ANALYSIS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def _drop_executor(executor):
+    """Forgets a broken pool, so the next call builds a fresh one."""
+    global _executor
+    with _executor_lock:
+        # Another call may already have replaced it
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _map_chunks(fn, pgn_list: list) -> list:
+    """
+    fn over the PGNs in chunks on the process pool, one result per chunk.
+    If a worker process dies, the pool is replaced and the work retried once,
+    then run inline.
+    """
+    for _ in range(2):
+        executor = _get_executor()
+        try:
+            return list(executor.map(fn, _chunks(pgn_list, ANALYSIS_CHUNK_SIZE)))
+        except BrokenProcessPool as e:
+            # A worker was killed (OOM, signal) and took the whole pool with it
+            print(f"Analysis Pool Error: {e}")
+            _drop_executor(executor)
+    return [fn(chunk) for chunk in _chunks(pgn_list, ANALYSIS_CHUNK_SIZE)]
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _use_pool(count: int, workers: int) -> bool:
+    return workers > 1 and count >= ANALYSIS_PARALLEL_MIN_GAMES
+
+
+def _extract_chunk(pgn_list: list) -> list:
+    """Worker body: features for every PGN in the chunk, in order."""
+    return [analysis.extract_features(pgn) for pgn in pgn_list]
+
+
+def _summarize_chunk(pgn_list: list) -> dict:
+    """Worker body: partial totals for the chunk, so only a small dict crosses processes."""
+    return summarize_features(_extract_chunk(pgn_list))
+
+
+def summarize_features(features_list: list) -> dict:
+    """Folds per-game features into totals (scores, opening histogram, game count)."""
+    totals = {
+        "total_games": 0, "captures": 0, "checks": 0, "castles": 0,
+        "opening_counts": {}, "opening_name_counts": {},
+    }
+    for features in features_list:
+        totals["total_games"] += 1
+        totals["captures"] += features["captures"]
+        totals["checks"] += features["checks"]
+        totals["castles"] += features["castles"]
+        if features["first_move_san"]:
+            counts = totals["opening_counts"]
+            counts[features["first_move_san"]] = counts.get(features["first_move_san"], 0) + 1
+        label = analysis.opening_label(features)
+        if label:
+            counts = totals["opening_name_counts"]
+            counts[label] = counts.get(label, 0) + 1
+    return totals
+
+
+def merge_totals(partials) -> dict:
+    """Adds up partial totals produced by summarize_features."""
+    merged = summarize_features([])
+    for partial in partials:
+        for field in ("total_games", "captures", "checks", "castles"):
+            merged[field] += partial[field]
+        for histogram in ("opening_counts", "opening_name_counts"):
+            for key, count in partial[histogram].items():
+                merged[histogram][key] = merged[histogram].get(key, 0) + count
+    return merged
+
+
+def extract_features_many(pgn_list: list, workers: int = None) -> list:
+    """
+    Per-game features for a list of PGNs, in the same order.
+    Runs on the process pool for large inputs and inline otherwise.
+    """
+    workers = ANALYSIS_WORKERS if workers is None else workers
+    if not _use_pool(len(pgn_list), workers):
+        return _extract_chunk(pgn_list)
+
+    results = []
+    for chunk_features in _map_chunks(_extract_chunk, pgn_list):
+        results.extend(chunk_features)
+    return results
+
+
+def analyze_pgns(pgn_list: list, workers: int = None) -> dict:
+    """
+    Totals for a list of PGNs (see summarize_features), with the aggressive and
+    defensive scores filled in. Large inputs are fanned out to the process pool.
+    """
+    workers = ANALYSIS_WORKERS if workers is None else workers
+    if _use_pool(len(pgn_list), workers):
+        totals = merge_totals(_map_chunks(_summarize_chunk, pgn_list))
+    else:
+        totals = _summarize_chunk(pgn_list)
+
+    totals["aggressive_score"] = analysis.aggressive_score(totals["captures"], totals["checks"])
+    totals["defensive_score"] = analysis.defensive_score(totals["castles"])
+    return totals
@@ -0,0 +1,30 @@
+"""
+One-off job: fills games.content_hash for games saved before deduplication.
+
+Existing databases get the column and its unique index from `python database.py`
+(or AUTO_CREATE_SCHEMA at startup) first. Then, from the backend folder:
+    python backfill_game_hashes.py [--delete-duplicates]
+
+Without --delete-duplicates, repeated games are only counted and keep a NULL hash.
+"""
+import argparse
+import crud
+from database import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--delete-duplicates", action="store_true", help="Delete repeated games and rebuild the owners' totals")
+    parser.add_argument("--batch-size", type=int, default=crud.IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = crud.backfill_game_hashes(db, batch_size=args.batch_size, delete_duplicates=args.delete_duplicates)
+    finally:
+        db.close()
+    print(f"Hashed {result['hashed']} games; {result['duplicates']} duplicates found, {result['deleted']} deleted.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+One-off job: writes the position index (game_positions) for games saved before it existed.
+The table is created by `python database.py` / AUTO_CREATE_SCHEMA like the others.
+
+From the backend folder:
+    python backfill_game_positions.py
+"""
+import argparse
+import crud
+from database import SessionLocal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=crud.IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        indexed = crud.backfill_game_positions(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Indexed positions for {indexed} games.")
+
+
+if __name__ == "__main__":
+    main()
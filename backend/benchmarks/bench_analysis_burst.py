@@ -0,0 +1,66 @@
+"""
+Bursts of overlapping GET /users/me/analysis for one user, with and without
+single-flight coalescing. Each round first saves a game, so the burst lands
+on fresh data (new data version, cold AI cache).
+
+Run from the backend folder:
+    python -m benchmarks.bench_analysis_burst [--games 1000] [--burst 20] [--rounds 10]
+"""
+import argparse
+import asyncio
+import time
+from benchmarks.corpus import synthetic_pgns
+from benchmarks.harness import boot_app, percentile
+from benchmarks.load_test import seed_user
+
+
+async def run(args):
+    import httpx
+
+    app = boot_app()
+    import crud
+    import metrics
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        headers = await seed_user(client, "burst", games=args.games, seed=0)
+        extra_games = synthetic_pgns(2 * args.rounds, seed=1)
+
+        for enabled in (False, True):
+            crud.ANALYSIS_SINGLEFLIGHT = enabled
+            before = crud.analysis_flight.stats()
+            latencies = []
+
+            async def one():
+                start = time.perf_counter()
+                response = await client.get("/users/me/analysis", headers=headers)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                await client.post("/games/", json={"pgn_moves": extra_games.pop()}, headers=headers)
+                await asyncio.gather(*(one() for _ in range(args.burst)))
+            elapsed = time.perf_counter() - start
+
+            after = crud.analysis_flight.stats()
+            executed = after["executed"] - before["executed"] if enabled else len(latencies)
+            coalesced = after["coalesced"] - before["coalesced"]
+            print(f"single-flight {'on ' if enabled else 'off'}: {len(latencies)} requests in {elapsed:.2f}s, "
+                  f"computed {executed}, coalesced {coalesced}, "
+                  f"p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms")
+
+    flight_metrics = [line for line in metrics.render().splitlines() if line.startswith("analysis_requests_")]
+    print("\n".join(flight_metrics))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
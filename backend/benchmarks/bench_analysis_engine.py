@@ -0,0 +1,64 @@
+"""
+Compares the multi-process analysis engine with the original serial replay loop.
+
+Run from the backend folder:
+    python -m benchmarks.bench_analysis_engine [--sizes 100 1000 10000] [--workers N]
+"""
+import argparse
+import io
+import time
+import chess.pgn
+from benchmarks.corpus import synthetic_pgns
+import analysis_engine
+
+
+def serial_replay(pgn_list: list) -> dict:
+    """The loop crud.analyze_user_games used to run on every request."""
+    aggressive_score = 0
+    defensive_score = 0
+    opening_moves = []
+    for pgn_moves in pgn_list:
+        game_data = chess.pgn.read_game(io.StringIO(pgn_moves))
+        board = game_data.board()
+        all_moves = list(game_data.mainline_moves())
+        if all_moves:
+            opening_moves.append(board.san(all_moves[0]))
+            for move in all_moves:
+                if board.is_capture(move):
+                    aggressive_score += 0.5
+                if board.is_castling(move):
+                    defensive_score += 1
+                board.push(move)
+                if board.is_check():
+                    aggressive_score += 1
+    return {"aggressive_score": aggressive_score, "defensive_score": defensive_score}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--workers", type=int, default=analysis_engine.ANALYSIS_WORKERS)
+    args = parser.parse_args()
+
+    # Start the pool up front so the first measurement doesn't pay for process spawns
+    analysis_engine.analyze_pgns(synthetic_pgns(analysis_engine.ANALYSIS_PARALLEL_MIN_GAMES), workers=args.workers)
+
+    print(f"{'games':>8} {'serial (s)':>12} {'engine (s)':>12} {'speedup':>8}")
+    for size in args.sizes:
+        pgn_list = synthetic_pgns(size)
+        serial, serial_time = timed(serial_replay, pgn_list)
+        engine, engine_time = timed(analysis_engine.analyze_pgns, pgn_list, workers=args.workers)
+        # Both paths must agree before the timings mean anything
+        assert serial["aggressive_score"] == engine["aggressive_score"]
+        assert serial["defensive_score"] == engine["defensive_score"]
+        print(f"{size:>8} {serial_time:>12.3f} {engine_time:>12.3f} {serial_time / engine_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Positional features: bitboard_features (record bitboards, then NumPy over all
+plies of all games at once) against a naive per-square Python implementation
+of the same features, with the current captures/checks/castling pass as the
+baseline. Also checks that both implementations agree on every ply.
+
+Run from the backend folder:
+    python -m benchmarks.bench_bitboard_features [--games 500]
+"""
+import argparse
+import time
+import chess
+import numpy as np
+from benchmarks.corpus import synthetic_pgns
+import analysis
+import bitboard_features
+import move_codec
+
+VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
+CENTER = (chess.D4, chess.E4, chess.D5, chess.E5)
+
+
+def naive_side(board: chess.Board, color: bool) -> list:
+    """One side's SIDE_FEATURES, looking at the board one square at a time."""
+    material = 0
+    pawns_per_file = [0] * 8
+    pawn_squares = []
+    developed = 0
+    attacked = set()
+    enemy_attacked = set()
+    home_rank = 0 if color == chess.WHITE else 7
+    for square in chess.SQUARES:
+        piece = board.piece_at(square)
+        if piece is None:
+            continue
+        if piece.color == color:
+            material += VALUES[piece.piece_type]
+            if piece.piece_type == chess.PAWN:
+                pawns_per_file[chess.square_file(square)] += 1
+                pawn_squares.append(square)
+            if piece.piece_type in (chess.KNIGHT, chess.BISHOP) and chess.square_rank(square) != home_rank:
+                developed += 1
+            attacked.update(board.attacks(square))
+        else:
+            enemy_attacked.update(board.attacks(square))
+
+    files = [count > 0 for count in pawns_per_file]
+    doubled = sum(count - 1 for count in pawns_per_file if count)
+    islands = sum(1 for f in range(8) if files[f] and (f == 0 or not files[f - 1]))
+    isolated = sum(
+        pawns_per_file[f] for f in range(8)
+        if files[f] and not (f > 0 and files[f - 1]) and not (f < 7 and files[f + 1])
+    )
+    passed = 0
+    for square in pawn_squares:
+        file, rank = chess.square_file(square), chess.square_rank(square)
+        blockers = [
+            s for s in chess.SQUARES
+            if abs(chess.square_file(s) - file) <= 1
+            and (chess.square_rank(s) > rank if color == chess.WHITE else chess.square_rank(s) < rank)
+            and board.piece_at(s) == chess.Piece(chess.PAWN, not color)
+        ]
+        passed += not blockers
+    own = {s for s in chess.SQUARES if board.color_at(s) == color}
+    king = board.king(color)
+    king_zone = set(board.attacks(king)) | {king} if king is not None else set()
+    return [
+        material, len(pawn_squares), doubled, isolated, islands, passed, developed,
+        len(attacked - own), len(attacked & set(CENTER)), len(enemy_attacked & king_zone),
+    ]
+
+
+def naive_features(board: chess.Board, moves) -> np.ndarray:
+    rows = []
+    for move in [None] + list(moves):
+        if move is not None:
+            board.push(move)
+        white, black = naive_side(board, chess.WHITE), naive_side(board, chess.BLACK)
+        rows.append(white + black + [white[0] - black[0]])
+    return np.array(rows, dtype=np.int16)
+
+
+def timed(label: str, plies: int, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44} {elapsed:7.2f}s  {elapsed / plies * 1e6:7.1f} us/ply")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=500)
+    args = parser.parse_args()
+
+    packed_games = []
+    for pgn in synthetic_pgns(args.games, seed=7):
+        columns = move_codec.game_columns(analysis.parse_pgn(pgn))
+        packed_games.append((columns["moves_packed"], columns["start_fen"]))
+    plies = sum(len(packed) // 2 + 1 for packed, _ in packed_games)
+    n_features = len(bitboard_features.PLY_FEATURES)
+    print(f"{args.games} games, {plies} positions, {n_features} features per position\n")
+
+    timed("baseline: captures/checks/castling (3)", plies, lambda: [
+        analysis.extract_packed_features(packed, start_fen) for packed, start_fen in packed_games
+    ])
+    bitboards = timed("bitboards: replay + record", plies, lambda: [
+        bitboard_features.record_bitboards(move_codec.start_board(fen), move_codec.decode_moves(packed))
+        for packed, fen in packed_games
+    ])
+    stacked = np.concatenate(bitboards)
+    fast = timed(f"bitboards: NumPy features ({n_features})", plies, lambda: bitboard_features.ply_features(stacked))
+    timed("bitboards: end to end incl. game summaries", plies, lambda: (
+        bitboard_features.extract_positional_features_many(packed_games)
+    ))
+    naive = timed(f"naive per-square Python ({n_features})", plies, lambda: np.concatenate([
+        naive_features(move_codec.start_board(fen), move_codec.decode_moves(packed))
+        for packed, fen in packed_games
+    ]))
+
+    mismatched = np.nonzero(np.any(fast != naive, axis=0))[0]
+    if len(mismatched):
+        print("\nMISMATCH in", [bitboard_features.PLY_FEATURES[i] for i in mismatched])
+    else:
+        print("\nBoth implementations agree on every position.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Login throughput, and latency of an unrelated endpoint, during a burst of logins.
+
+Run from the backend folder:
+    python -m benchmarks.bench_login_storm [--logins 200] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import time
+from benchmarks.harness import boot_app, percentile
+
+
+async def run(args):
+    import httpx
+
+    app = boot_app(
+        PASSWORD_HASH_ROUNDS=args.rounds,
+        PASSWORD_HASH_WORKERS=args.hash_workers,
+        PASSWORD_HASH_MAX_PENDING=args.max_pending,
+        PASSWORD_HASH_EXECUTOR=args.executor,
+    )
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/users/", json={"username": "storm", "password": "password123"})
+
+        login_status = {}
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def login():
+            async with semaphore:
+                response = await client.post("/token", data={"username": "storm", "password": "password123"})
+                login_status[response.status_code] = login_status.get(response.status_code, 0) + 1
+
+        probe_latencies = []
+        storm_done = asyncio.Event()
+
+        async def probe():
+            # Stands in for everyone else's traffic while the storm runs
+            while not storm_done.is_set():
+                start = time.perf_counter()
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        storm_done.set()
+        await probe_task
+
+    print(f"Logins: {args.logins} in {elapsed:.2f}s ({args.logins / elapsed:.1f}/s), status counts {login_status}")
+    print(f"GET / during storm: n={len(probe_latencies)} "
+          f"p50={percentile(probe_latencies, 50) * 1000:.1f}ms "
+          f"p99={percentile(probe_latencies, 99) * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=535000)
+    parser.add_argument("--hash-workers", type=int, default=2)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
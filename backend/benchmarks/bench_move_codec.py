@@ -0,0 +1,69 @@
+"""
+Storage size and replay speed of packed moves (move_codec) versus PGN text.
+
+Run from the backend folder:
+    python -m benchmarks.bench_move_codec [--games 100000]
+"""
+import argparse
+import io
+import time
+import chess.pgn
+from benchmarks.corpus import synthetic_pgns
+import move_codec
+
+
+def replay_pgn(pgn_list: list) -> int:
+    """What every analysis pass used to do: tokenize the PGN, parse SAN, push."""
+    plies = 0
+    for pgn_moves in pgn_list:
+        game_data = chess.pgn.read_game(io.StringIO(pgn_moves))
+        board = game_data.board()
+        for move in game_data.mainline_moves():
+            board.push(move)
+            plies += 1
+    return plies
+
+
+def replay_packed(packed_list: list) -> int:
+    """Decode 16-bit codes and push; no SAN parsing."""
+    plies = 0
+    for packed in packed_list:
+        board = move_codec.start_board()
+        for move in move_codec.decode_moves(packed):
+            board.push(move)
+            plies += 1
+    return plies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"Generating {args.games} synthetic games...")
+    pgn_list = synthetic_pgns(args.games)
+    packed_list = [
+        move_codec.game_columns(chess.pgn.read_game(io.StringIO(pgn)))["moves_packed"]
+        for pgn in pgn_list
+    ]
+
+    pgn_bytes = sum(len(pgn.encode("utf-8")) for pgn in pgn_list)
+    packed_bytes = sum(len(packed) for packed in packed_list)
+    print(f"Storage: PGN {pgn_bytes / 1e6:.1f} MB, packed {packed_bytes / 1e6:.1f} MB "
+          f"({pgn_bytes / packed_bytes:.1f}x smaller)")
+
+    start = time.perf_counter()
+    pgn_plies = replay_pgn(pgn_list)
+    pgn_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    packed_plies = replay_packed(packed_list)
+    packed_time = time.perf_counter() - start
+
+    assert pgn_plies == packed_plies
+    print(f"Replay:  PGN {pgn_time:.2f}s, packed {packed_time:.2f}s "
+          f"({pgn_time / packed_time:.1f}x faster, {pgn_plies} plies)")
+
+
+if __name__ == "__main__":
+    main()
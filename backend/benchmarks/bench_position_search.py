@@ -0,0 +1,93 @@
+"""
+Position search: GET /games/positions (indexed Zobrist lookup) against a full
+scan that replays every stored game, on a synthetic corpus.
+
+The scan replays move_codec's packed moves, the cheapest replay available;
+scanning PGN text would be slower still.
+
+Run from the backend folder:
+    python -m benchmarks.bench_position_search [--games 5000] [--queries 50]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from benchmarks.harness import boot_app, percentile
+from benchmarks.load_test import seed_user
+
+
+def scan_for_position(db, user_id: int, zobrist: int) -> set:
+    """The pre-index way: replay every game of the user and compare keys at each ply."""
+    import models
+    import positions
+
+    matches = set()
+    rows = db.query(models.Game.id, models.Game.moves_packed, models.Game.start_fen).filter(
+        models.Game.user_id == user_id
+    )
+    for game_id, packed, start_fen in rows:
+        if any(key == zobrist for _, key in positions.packed_keys(packed, start_fen)):
+            matches.add(game_id)
+    return matches
+
+
+async def run(args):
+    import httpx
+
+    app = boot_app()
+    import database
+    import models
+    import move_codec
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        headers = await seed_user(client, "positions", games=args.games, seed=0)
+        print(f"Imported {args.games} games (with position index) in {time.perf_counter() - start:.1f}s")
+
+        db = database.SessionLocal()
+        user_id = db.query(models.User.id).filter(models.User.username == "positions").scalar()
+        print(f"Index rows: {db.query(models.GamePosition).count()}")
+
+        # Query positions that occur in the corpus: early plies match many games, late ones few
+        rng = random.Random(1)
+        games = db.query(models.Game.moves_packed).filter(models.Game.user_id == user_id).all()
+        fens = []
+        for _ in range(args.queries):
+            moves = move_codec.decode_moves(rng.choice(games).moves_packed)
+            board = move_codec.start_board()
+            for move in moves[: rng.choice([2, 4, 8, 16, 32])]:
+                board.push(move)
+            fens.append(board.fen())
+
+        indexed, hits = [], []
+        for fen in fens:
+            start = time.perf_counter()
+            response = await client.get("/games/positions", params={"fen": fen, "limit": 500}, headers=headers)
+            indexed.append(time.perf_counter() - start)
+            hits.append(len(response.json()))
+
+        import positions
+        scanned = []
+        for fen in fens[: args.scan_queries]:
+            start = time.perf_counter()
+            scan_for_position(db, user_id, positions.fen_key(fen))
+            scanned.append(time.perf_counter() - start)
+        db.close()
+
+    print(f"Matches per query: median {statistics.median(hits)}, max {max(hits)}")
+    print(f"Indexed lookup (HTTP): p50={percentile(indexed, 50) * 1000:.2f}ms p99={percentile(indexed, 99) * 1000:.2f}ms")
+    print(f"Full replay scan:      p50={percentile(scanned, 50) * 1000:.1f}ms ({len(scanned)} queries)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--scan-queries", type=int, default=5, help="The scan is slow, so it runs fewer queries")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
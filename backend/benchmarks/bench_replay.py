@@ -0,0 +1,54 @@
+"""
+Micro-benchmark for the per-game replay loop (analysis.extract_features) and
+for crud.analyze_user_games, which should stay flat as the game count grows.
+
+Run from the backend folder:
+    python -m benchmarks.bench_replay [--games 100 1000 5000] [--repeat 20]
+"""
+import argparse
+import io
+import time
+from benchmarks.corpus import synthetic_pgns
+from benchmarks.harness import boot_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--games", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    boot_app()
+    import analysis
+    import crud
+    import importer
+    import models
+    from database import SessionLocal
+
+    db = SessionLocal()
+    print(f"{'games':>6} {'replay µs/ply':>14} {'analyze_user_games ms':>22}")
+    for count in args.games:
+        pgn_list = synthetic_pgns(count)
+
+        # 1. The replay loop on its own
+        start = time.perf_counter()
+        plies = sum(analysis.extract_features(pgn)["ply_count"] for pgn in pgn_list)
+        per_ply = (time.perf_counter() - start) / plies * 1e6
+
+        # 2. The analysis call against a user holding `count` games
+        user = models.User(username=f"bench-{count}-{time.time()}", hashed_password="x")
+        db.add(user)
+        db.commit()
+        crud.import_user_games(db, importer.iter_pgn_games(io.StringIO("\n\n".join(pgn_list) + "\n")), user.id)
+        crud.analyze_user_games(db, user.id) # Warm-up (queues the stub AI job)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            crud.analyze_user_games(db, user.id)
+        per_call = (time.perf_counter() - start) / args.repeat * 1000
+
+        print(f"{count:>6} {per_ply:>14.1f} {per_call:>22.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Profile page latency: the polling flow (GET /users/me/analysis, then poll the
+AI job) against the Server-Sent Events stream. Reports time to first byte,
+first AI text and the complete report, with a slow stub AI backend.
+
+Runs a real uvicorn server on a local port, because httpx's ASGITransport
+buffers the whole response and would hide the streaming.
+
+Run from the backend folder:
+    python -m benchmarks.bench_sse [--runs 5] [--ai-latency 2]
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from benchmarks.harness import boot_app
+from benchmarks.load_test import seed_user
+
+
+async def polling_flow(client, headers) -> dict:
+    start = time.perf_counter()
+    response = await client.get("/users/me/analysis", headers=headers)
+    first_byte = time.perf_counter() - start
+    job_id = response.json()["ai_report_job_id"]
+    while job_id:
+        await asyncio.sleep(0.1)
+        job = (await client.get(f"/users/me/analysis/jobs/{job_id}", headers=headers)).json()
+        if job["status"] in ("done", "failed"):
+            break
+    report = time.perf_counter() - start
+    # Polling gets no partial text, so the first AI text is the whole report
+    return {"first_byte": first_byte, "first_ai_text": report, "report": report}
+
+
+async def streaming_flow(client, headers) -> dict:
+    timings = {}
+    start = time.perf_counter()
+    async with client.stream("GET", "/users/me/analysis/stream", headers=headers) as response:
+        async for line in response.aiter_lines():
+            elapsed = time.perf_counter() - start
+            timings.setdefault("first_byte", elapsed)
+            if line == "event: token":
+                timings.setdefault("first_ai_text", elapsed)
+            elif line == "event: done":
+                timings["report"] = elapsed
+    return timings
+
+
+async def run(args):
+    import httpx
+    import uvicorn
+
+    app = boot_app(ai_latency=args.ai_latency, AI_CACHE_BACKEND="none")
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit(f"Could not start the server on port {args.port}")
+        await asyncio.sleep(0.05)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60) as client:
+        headers = await seed_user(client, "sse", games=args.games, seed=0)
+        for name, flow in (("polling", polling_flow), ("streaming", streaming_flow)):
+            samples = [await flow(client, headers) for _ in range(args.runs)]
+            print(f"{name:<10} " + "  ".join(
+                f"{key}={statistics.median(s[key] for s in samples) * 1000:7.1f}ms"
+                for key in ("first_byte", "first_ai_text", "report")
+            ))
+
+    server.should_exit = True
+    thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--ai-latency", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
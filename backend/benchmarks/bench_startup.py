@@ -0,0 +1,60 @@
+"""
+Cold-start cost: time to import `main`, run the startup hook, and serve the
+first request, each measured in a fresh interpreter.
+
+Run from the backend folder:
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from benchmarks.harness import BACKEND_DIR
+
+# Runs inside each fresh interpreter
+PROBE = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:  # runs the lifespan startup hook
+    started = time.perf_counter()
+    client.get("/")
+    first_request = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "startup_s": started - imported,
+    "first_request_s": first_request - started,
+    "total_s": first_request - start,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="chess-bench-"), "startup.db"))
+    env.setdefault("AI_BACKEND", "stub")
+
+    samples = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"Median of {args.runs} cold starts:")
+    for key in ("import_s", "startup_s", "first_request_s", "total_s"):
+        print(f"  {key:<16} {statistics.median(s[key] for s in samples) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+import random
+import sys
+import chess
+import chess.pgn
+
+# Let benchmark scripts import the backend modules (crud, analysis, ...)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def random_game(rng: random.Random, max_plies: int = 80) -> chess.pgn.Game:
+    """Plays random legal moves until the game ends or max_plies is reached."""
+    board = chess.Board()
+    for _ in range(rng.randint(max_plies // 2, max_plies)):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        # Favour captures a little so the games look less like shuffling
+        captures = [m for m in moves if board.is_capture(m)]
+        pool = captures if captures and rng.random() < 0.4 else moves
+        board.push(rng.choice(pool))
+    return chess.pgn.Game.from_board(board)
+
+
+def synthetic_pgns(count: int, seed: int = 42, max_plies: int = 80) -> list:
+    """A reproducible list of `count` random games as PGN strings."""
+    rng = random.Random(seed)
+    return [str(random_game(rng, max_plies)) for _ in range(count)]
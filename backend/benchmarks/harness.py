@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+
+# Let benchmark scripts import the backend modules (main, crud, ...)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def boot_app(database_url: str = None, ai_latency: float = 0.0, **env):
+    """
+    Imports main.app against a throwaway SQLite database (or `database_url`)
+    with the stub AI backend. Must run before anything imports `main`.
+    Extra keyword arguments are set as environment variables.
+    """
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="chess-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["AI_BACKEND"] = "stub"
+    os.environ["AI_STUB_LATENCY_SECONDS"] = str(ai_latency)
+    for name, value in env.items():
+        os.environ[name] = str(value)
+
+    import database
+    import main
+    # httpx's ASGITransport doesn't run the lifespan hook, so create the schema here
+    database.init_db()
+    return main.app
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile; 0 for no samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,220 @@
+import chess
+import numpy as np
+import move_codec
+
+# --- Positional Features from Bitboards ---
+# Replaying a game only records each position's piece bitboards (seven 64-bit
+# ints per ply). All features are then computed at once for every ply, and for
+# many games together, with NumPy shift/mask/popcount operations on uint64
+# arrays, so adding features costs array ops rather than Python per square.
+# Kept out of analysis.py so the NumPy import stays off the app's startup path.
+
+# Columns of the recorded bitboard array
+PAWNS, KNIGHTS, BISHOPS, ROOKS, QUEENS, KINGS, WHITE = range(7)
+
+# Per-ply features, each for white and black (plus the material balance)
+SIDE_FEATURES = (
+    "material",
+    "pawns",
+    "doubled_pawns",
+    "isolated_pawns",
+    "pawn_islands",
+    "passed_pawns",
+    "developed_minors",
+    "mobility",
+    "center_control",
+    "king_pressure", # Attacks by the opponent on the squares around this side's king
+)
+PLY_FEATURES = tuple(
+    f"{color}_{name}" for color in ("white", "black") for name in SIDE_FEATURES
+) + ("material_balance",)
+
+PIECE_VALUES = ((PAWNS, 1), (KNIGHTS, 3), (BISHOPS, 3), (ROOKS, 5), (QUEENS, 9))
+
+_U = np.uint64
+NOT_A = _U(~chess.BB_FILE_A & chess.BB_ALL)
+NOT_H = _U(~chess.BB_FILE_H & chess.BB_ALL)
+NOT_AB = _U(~(chess.BB_FILE_A | chess.BB_FILE_B) & chess.BB_ALL)
+NOT_GH = _U(~(chess.BB_FILE_G | chess.BB_FILE_H) & chess.BB_ALL)
+CENTER = _U(chess.BB_D4 | chess.BB_E4 | chess.BB_D5 | chess.BB_E5)
+RANK_1 = _U(chess.BB_RANK_1)
+RANK_8 = _U(chess.BB_RANK_8)
+FIRST_RANK_TO_FILES = _U(0x0101010101010101) # Multiplying spreads a rank-1 file set over every rank
+
+
+# One-step moves in each direction, masking off wrap-around between the a and h files.
+# (NumPy 2 keeps `uint64 << int` in uint64, so plain ints work as shift amounts.)
+def _north(b): return b << 8
+def _south(b): return b >> 8
+def _east(b): return (b << 1) & NOT_A
+def _west(b): return (b >> 1) & NOT_H
+def _north_east(b): return (b << 9) & NOT_A
+def _north_west(b): return (b << 7) & NOT_H
+def _south_east(b): return (b >> 7) & NOT_A
+def _south_west(b): return (b >> 9) & NOT_H
+
+ORTHOGONAL = (_north, _south, _east, _west)
+DIAGONAL = (_north_east, _north_west, _south_east, _south_west)
+
+
+def _popcount(b):
+    return np.bitwise_count(b).astype(np.int16)
+
+
+def _slide(sliders, empty, directions):
+    """Squares attacked by sliding pieces: fill each ray through empty squares, up to and including the first blocker."""
+    attacks = np.zeros_like(sliders)
+    for step in directions:
+        ray = sliders
+        flood = sliders
+        for _ in range(6):
+            ray = step(ray) & empty
+            flood = flood | ray # Not |=, which would write into `sliders`
+        attacks |= step(flood)
+    return attacks
+
+
+def _knight_attacks(knights):
+    one = ((knights >> 1) & NOT_H) | ((knights << 1) & NOT_A)
+    two = ((knights >> 2) & NOT_GH) | ((knights << 2) & NOT_AB)
+    return (one << 16) | (one >> 16) | (two << 8) | (two >> 8)
+
+
+def _king_zone(kings):
+    """The king's square and every square next to it."""
+    row = kings | _east(kings) | _west(kings)
+    return row | _north(row) | _south(row)
+
+
+def _file_set(pawns):
+    """Which files hold at least one pawn, as bits 0-7 (a-h)."""
+    folded = pawns | (pawns >> 8)
+    folded |= folded >> 16
+    folded |= folded >> 32
+    return folded & _U(0xFF)
+
+
+def _fill_south(b):
+    b = b | (b >> 8)
+    b |= b >> 16
+    return b | (b >> 32)
+
+
+def _fill_north(b):
+    b = b | (b << 8)
+    b |= b << 16
+    return b | (b << 32)
+
+
+def record_bitboards(board: chess.Board, moves) -> np.ndarray:
+    """
+    Pushes `moves` onto `board`, recording the piece bitboards of the start
+    position and of the position after each move: a (plies + 1, 7) uint64 array.
+    """
+    rows = [(board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings, board.occupied_co[chess.WHITE])]
+    for move in moves:
+        board.push(move)
+        rows.append((board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings, board.occupied_co[chess.WHITE]))
+    return np.array(rows, dtype=np.uint64)
+
+
+def ply_features(bitboards: np.ndarray) -> np.ndarray:
+    """
+    Every PLY_FEATURES column for each row of recorded bitboards (any number of
+    positions, from any number of games): a (rows, len(PLY_FEATURES)) int16 array.
+    """
+    white = bitboards[:, WHITE]
+    occupied = np.zeros(len(bitboards), dtype=np.uint64)
+    for column in (PAWNS, KNIGHTS, BISHOPS, ROOKS, QUEENS, KINGS):
+        occupied |= bitboards[:, column]
+    empty = ~occupied
+    sides = {"white": white, "black": occupied & ~white}
+
+    pieces = {}
+    attacks = {}
+    for color, own in sides.items():
+        pieces[color] = {column: bitboards[:, column] & own for column in (PAWNS, KNIGHTS, BISHOPS, ROOKS, QUEENS, KINGS)}
+        p = pieces[color]
+        pawn_attacks = (
+            _north_east(p[PAWNS]) | _north_west(p[PAWNS]) if color == "white"
+            else _south_east(p[PAWNS]) | _south_west(p[PAWNS])
+        )
+        attacks[color] = (
+            pawn_attacks
+            | _knight_attacks(p[KNIGHTS])
+            | _slide(p[BISHOPS] | p[QUEENS], empty, DIAGONAL)
+            | _slide(p[ROOKS] | p[QUEENS], empty, ORTHOGONAL)
+            | (_king_zone(p[KINGS]) & ~p[KINGS])
+        )
+
+    columns = {}
+    for color, own in sides.items():
+        enemy = "black" if color == "white" else "white"
+        p = pieces[color]
+        pawns = p[PAWNS]
+
+        material = np.zeros(len(bitboards), dtype=np.int16)
+        for column, value in PIECE_VALUES:
+            material += _popcount(p[column]) * np.int16(value)
+        columns[f"{color}_material"] = material
+
+        files = _file_set(pawns)
+        pawn_count = _popcount(pawns)
+        columns[f"{color}_pawns"] = pawn_count
+        columns[f"{color}_doubled_pawns"] = pawn_count - _popcount(files)
+        isolated_files = files & ~((files << 1) | (files >> 1))
+        columns[f"{color}_isolated_pawns"] = _popcount(pawns & (isolated_files * FIRST_RANK_TO_FILES))
+        columns[f"{color}_pawn_islands"] = _popcount(files & ~(files << 1))
+
+        # A pawn is passed if no enemy pawn is ahead of it on its own or an adjacent file
+        enemy_pawns = pieces[enemy][PAWNS]
+        if color == "white":
+            blocked = _fill_south(_south(enemy_pawns))
+        else:
+            blocked = _fill_north(_north(enemy_pawns))
+        blocked |= _east(blocked) | _west(blocked)
+        columns[f"{color}_passed_pawns"] = _popcount(pawns & ~blocked)
+
+        home_rank = RANK_1 if color == "white" else RANK_8
+        columns[f"{color}_developed_minors"] = _popcount((p[KNIGHTS] | p[BISHOPS]) & ~home_rank)
+        columns[f"{color}_mobility"] = _popcount(attacks[color] & ~own)
+        columns[f"{color}_center_control"] = _popcount(attacks[color] & CENTER)
+        columns[f"{color}_king_pressure"] = _popcount(attacks[enemy] & _king_zone(p[KINGS]))
+
+    columns["material_balance"] = columns["white_material"] - columns["black_material"]
+    return np.column_stack([columns[name] for name in PLY_FEATURES])
+
+
+def summarize_game(features: np.ndarray) -> dict:
+    """Game-level numbers from one game's ply_features rows."""
+    summary = {f"{name}_mean": round(float(value), 3) for name, value in zip(PLY_FEATURES, features.mean(axis=0))}
+    balance = features[:, PLY_FEATURES.index("material_balance")]
+    summary["material_balance_final"] = int(balance[-1])
+    summary["material_swing"] = int(np.abs(np.diff(balance)).sum())
+    # Plies where the pawn structure (doubled/isolated/islands/passed, either side) changed
+    structure = features[:, [PLY_FEATURES.index(f"{color}_{name}") for color in ("white", "black")
+                             for name in ("doubled_pawns", "isolated_pawns", "pawn_islands", "passed_pawns")]]
+    summary["pawn_structure_changes"] = int(np.any(np.diff(structure, axis=0) != 0, axis=1).sum())
+    return summary
+
+
+def extract_positional_features(board: chess.Board, moves) -> dict:
+    """Replays one game and returns its summarize_game() dict."""
+    return summarize_game(ply_features(record_bitboards(board, moves)))
+
+
+def extract_positional_features_many(games) -> list:
+    """
+    Same for many games: `games` yields (packed_moves, start_fen) pairs. All
+    positions are stacked into one array, so the features are computed in a
+    single vectorized pass.
+    """
+    recorded = [
+        record_bitboards(move_codec.start_board(start_fen), move_codec.decode_moves(packed))
+        for packed, start_fen in games
+    ]
+    if not recorded:
+        return []
+    features = ply_features(np.concatenate(recorded))
+    bounds = np.cumsum([len(r) for r in recorded])[:-1]
+    return [summarize_game(game_rows) for game_rows in np.split(features, bounds)]
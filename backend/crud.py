@@ -1,10 +1,55 @@
+import os
+import threading
+from datetime import datetime, timezone
+from cachetools import TTLCache
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
 import models
 import schemas
 import security # Import the security utilities
-import chess.pgn
-import io
 import ai_agent
+import database
+import analysis
+import analysis_engine
+import jobs
+import metrics
+import move_codec
+import population
+import positions
+import singleflight
+import trends
+
+# --- Authenticated User Cache ---
+# get_current_user runs on every protected request; caching the resolved
+# user for a short while saves a DB round trip on each of them.
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 1024))
+_user_cache = TTLCache(maxsize=AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_CACHE_TTL_SECONDS)
+_user_cache_lock = threading.Lock()
+
+# Rows per executemany INSERT (and per transaction) for bulk imports
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+# How many rejection reasons an import reports back
+IMPORT_MAX_ERRORS = 50
+# Write per-ply Zobrist keys at ingest so games can be searched by position
+POSITION_INDEX = os.getenv("POSITION_INDEX", "true").lower() == "true"
+
+# --- Analysis Single-Flight ---
+# Overlapping /users/me/analysis requests for the same user share one
+# computation. The key includes a per-user data version, bumped whenever the
+# user's games change, so a request made after a write never gets a result
+# computed before it.
+ANALYSIS_SINGLEFLIGHT = os.getenv("ANALYSIS_SINGLEFLIGHT", "true").lower() == "true"
+analysis_flight = singleflight.SingleFlight()
+_analysis_versions = {} # user_id -> data version
+_analysis_versions_lock = threading.Lock()
+
+def bump_analysis_version(user_id: int):
+    """Marks a user's games as changed, so later analysis requests start a new flight."""
+    with _analysis_versions_lock:
+        _analysis_versions[user_id] = _analysis_versions.get(user_id, 0) + 1
 
 
 
@@ -12,10 +57,37 @@ def get_user_by_username(db: Session, username: str):
     """Fetches a user by their username."""
     return db.query(models.User).filter(models.User.username == username).first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    """Creates a new user in the database."""
+def get_cached_user(db: Session, username: str):
+    """
+    Returns a schemas.User snapshot (id, username) for an authenticated username,
+    from the short-lived cache when possible. Returns None if the user doesn't exist.
+    """
+    with _user_cache_lock:
+        cached_user = _user_cache.get(username)
+    if cached_user is not None:
+        return cached_user
+
+    db_user = get_user_by_username(db, username=username)
+    if db_user is None:
+        return None # Misses aren't cached, so a new account works immediately
+    cached_user = schemas.User.model_validate(db_user)
+    with _user_cache_lock:
+        _user_cache[username] = cached_user
+    return cached_user
+
+def invalidate_cached_user(username: str):
+    """Drops a user from the auth cache; call this whenever a user row changes."""
+    with _user_cache_lock:
+        _user_cache.pop(username, None)
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str = None):
+    """
+    Creates a new user in the database.
+    Pass `hashed_password` if it was already computed (e.g. on the hashing pool).
+    """
     # Hash the password before storing it
-    hashed_password = security.get_password_hash(user.password)
+    if hashed_password is None:
+        hashed_password = security.get_password_hash(user.password)
     # Create a SQLAlchemy User model instance
     db_user = models.User(username=user.username, hashed_password=hashed_password)
     # Add the new user to the session
@@ -24,6 +96,7 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.commit()
     # Refresh the user instance to get the ID assigned by the database
     db.refresh(db_user)
+    invalidate_cached_user(db_user.username)
     return db_user
 
 def authenticate_user(db: Session, username: str, password: str):
@@ -35,30 +108,550 @@ def authenticate_user(db: Session, username: str, password: str):
         return None # Incorrect password
     return user # Authentication successful
 
-def create_user_game(db: Session, game: schemas.GameCreate, user_id: int):
-    """Creates a new game for a specific user."""
-    # Create a SQLAlchemy Game model instance
-    db_game = models.Game(**game.model_dump(), user_id=user_id)
-    db.add(db_game)
+async def authenticate_user_async(db: Session, username: str, password: str):
+    """
+    Authenticates a user without blocking the event loop.
+    The DB lookup runs in the threadpool and the hash check on security's hashing pool.
+    Hashes made with outdated parameters are replaced on a successful login.
+    May raise security.HashingOverloaded.
+    """
+    user = await run_in_threadpool(get_user_by_username, db, username)
+    if not user:
+        return None # User not found
+    matches, new_hash = await security.verify_and_update_password_async(password, user.hashed_password)
+    if not matches:
+        return None # Incorrect password
+    if new_hash:
+        await run_in_threadpool(update_user_password_hash, db, user, new_hash)
+    return user # Authentication successful
+
+def update_user_password_hash(db: Session, user: models.User, hashed_password: str):
+    """Stores a new password hash for a user."""
+    user.hashed_password = hashed_password
     db.commit()
+    invalidate_cached_user(user.username)
+    return user
+
+def get_user_game_by_hash(db: Session, user_id: int, content_hash: str):
+    """The user's game with this content hash, if any (one probe of the unique index)."""
+    return (
+        db.query(models.Game)
+        .filter(models.Game.user_id == user_id, models.Game.content_hash == content_hash)
+        .first()
+    )
+
+def create_user_game(db: Session, game: schemas.GameCreate, user_id: int):
+    """
+    Creates a new game for a specific user and updates their analysis totals.
+    Returns (game, created): resubmitting a game the user already has returns
+    the existing row instead of saving it again.
+    """
+    # Parse the PGN once; keep the packed moves and the counts next to the game
+    with metrics.span("pgn.parse"):
+        game_data = analysis.parse_pgn(game.pgn_moves)
+    with metrics.span("pgn.replay"):
+        features = analysis.extract_game_features(game_data) if game_data else analysis.empty_features()
+        game_columns = move_codec.game_columns(game_data)
+    if game_columns["content_hash"] is None:
+        game_columns["content_hash"] = move_codec.pgn_text_hash(game.pgn_moves)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    game_columns["played_at"] = game_columns["played_at"] or now
+
+    with metrics.span("db.dedup_probe"):
+        existing = get_user_game_by_hash(db, user_id, game_columns["content_hash"])
+    if existing is not None:
+        return existing, False
+
+    with metrics.span("db.save_game"):
+        # Create a SQLAlchemy Game model instance
+        db_game = models.Game(**game.model_dump(), user_id=user_id, created_at=now, **game_columns)
+        db.add(db_game)
+        db.add(models.GameFeatures(game=db_game, user_id=user_id, **features))
+        try:
+            # Hits the unique index (and assigns db_game.id) before any totals change
+            db.flush()
+        except IntegrityError:
+            # A concurrent request saved the same game first
+            db.rollback()
+            return get_user_game_by_hash(db, user_id, game_columns["content_hash"]), False
+        if POSITION_INDEX and game_data is not None:
+            _insert_positions(db, user_id, [(db_game.id, positions.game_keys(game_data))])
+        # Fold the new game into the running totals in the same transaction
+        add_games_to_analysis(db, user_id=user_id, features_list=[features])
+        trends.add_to_rollups(db, user_id, [(game_columns["played_at"], features)])
+        db.commit()
+    # The user's stats changed, so any cached AI profile is stale
+    ai_agent.invalidate_user_profile(user_id)
+    bump_analysis_version(user_id)
     db.refresh(db_game)
-    return db_game
+    return db_game, True
 
-def get_user_games(db: Session, user_id: int):
-    """Fetches all games for a specific user."""
-    return db.query(models.Game).filter(models.Game.user_id == user_id).all()
+def _insert_positions(db: Session, user_id: int, game_keys: list):
+    """Inserts position index rows for [(game_id, [(ply, key), ...]), ...] in one executemany."""
+    rows = [
+        {"game_id": game_id, "ply": ply, "user_id": user_id, "zobrist": key}
+        for game_id, keys in game_keys
+        for ply, key in keys
+    ]
+    if rows:
+        db.execute(insert(models.GamePosition), rows)
+
+def _insert_game_batch(db: Session, user_id: int, batch: list):
+    """
+    Inserts (pgn_text, game_columns, features, position_keys) tuples with one
+    executemany per table, then commits.
+    """
+    game_ids = db.execute(
+        insert(models.Game).returning(models.Game.id, sort_by_parameter_order=True),
+        [{"pgn_moves": pgn_text, "user_id": user_id, **columns} for pgn_text, columns, _, _ in batch],
+    ).scalars().all()
+    db.execute(
+        insert(models.GameFeatures),
+        [
+            {"game_id": game_id, "user_id": user_id, **features}
+            for game_id, (_, _, features, _) in zip(game_ids, batch)
+        ],
+    )
+    _insert_positions(db, user_id, [(game_id, keys) for game_id, (_, _, _, keys) in zip(game_ids, batch)])
+    add_games_to_analysis(db, user_id=user_id, features_list=[features for _, _, features, _ in batch])
+    trends.add_to_rollups(db, user_id, [(columns["played_at"], features) for _, columns, features, _ in batch])
+    db.commit()
+
+def _drop_duplicate_games(db: Session, user_id: int, batch: list) -> list:
+    """Filters out games the user already has, or that repeat earlier in the batch (by content_hash)."""
+    hashes = [item[1]["content_hash"] for item in batch]
+    known = {
+        row.content_hash
+        for row in db.query(models.Game.content_hash)
+        .filter(models.Game.user_id == user_id, models.Game.content_hash.in_(hashes))
+    }
+    fresh = []
+    for item in batch:
+        if item[1]["content_hash"] not in known:
+            known.add(item[1]["content_hash"])
+            fresh.append(item)
+    return fresh
+
+def _save_game_batch(db: Session, user_id: int, batch: list) -> int:
+    """
+    Inserts (pgn_text, game_columns, game_data) tuples minus duplicates; returns
+    how many games were saved. Features and position keys are only extracted
+    for the new games.
+    """
+    with metrics.span("db.dedup_probe"):
+        fresh = _drop_duplicate_games(db, user_id, batch)
+    if not fresh:
+        return 0
+    with metrics.span("pgn.replay"):
+        fresh = [
+            (
+                pgn_text,
+                columns,
+                analysis.extract_game_features(game_data),
+                positions.game_keys(game_data) if POSITION_INDEX else [],
+            )
+            for pgn_text, columns, game_data in fresh
+        ]
+    with metrics.span("db.insert_batch"):
+        try:
+            _insert_game_batch(db, user_id, fresh)
+        except IntegrityError:
+            # A concurrent import saved some of these first; re-check and retry once
+            db.rollback()
+            fresh = _drop_duplicate_games(db, user_id, fresh)
+            if fresh:
+                _insert_game_batch(db, user_id, fresh)
+    return len(fresh)
+
+def import_user_games(db: Session, parsed_games, user_id: int):
+    """
+    Bulk-saves games for a user.
+    `parsed_games` yields (pgn_text, game_data, error) tuples, see importer.py.
+    Games are inserted in batches of IMPORT_BATCH_SIZE, skipping ones the user
+    already has; returns accepted/duplicate/rejected counts.
+    """
+    accepted = 0
+    duplicates = 0
+    rejected = 0
+    errors = []
+    batch = []
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    for index, (pgn_text, game_data, error) in enumerate(parsed_games, start=1):
+        if error:
+            rejected += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append(f"Game {index}: {error}")
+            continue
+        with metrics.span("pgn.replay"):
+            columns = move_codec.game_columns(game_data)
+        if columns["content_hash"] is None:
+            columns["content_hash"] = move_codec.pgn_text_hash(pgn_text)
+        columns["played_at"] = columns["played_at"] or now
+        columns["created_at"] = now
+        batch.append((pgn_text, columns, game_data))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            saved = _save_game_batch(db, user_id, batch)
+            accepted += saved
+            duplicates += len(batch) - saved
+            batch = []
+
+    if batch:
+        saved = _save_game_batch(db, user_id, batch)
+        accepted += saved
+        duplicates += len(batch) - saved
+
+    if accepted:
+        ai_agent.invalidate_user_profile(user_id)
+        bump_analysis_version(user_id)
+    return {"accepted": accepted, "duplicates": duplicates, "rejected": rejected, "errors": errors}
+
+def backfill_game_hashes(db: Session, batch_size: int = IMPORT_BATCH_SIZE, delete_duplicates: bool = False):
+    """
+    One-off job: fills content_hash for games saved before deduplication existed.
+    A game that repeats one the user already has keeps a NULL hash, or is deleted
+    (with its features and positions, and the user's totals rebuilt) when
+    `delete_duplicates` is set.
+    """
+    hashed = 0
+    duplicates = 0
+    affected_users = set()
+    last_id = 0
+    while True:
+        rows = (
+            db.query(models.Game)
+            .filter(models.Game.content_hash.is_(None), models.Game.id > last_id)
+            .order_by(models.Game.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        hashes = {}
+        for db_game in rows:
+            if db_game.moves_packed:
+                hashes[db_game.id] = move_codec.content_hash(db_game.moves_packed, db_game.start_fen)
+            else:
+                # Games from before packed moves: hash them the way ingest would
+                game_data = analysis.parse_pgn(db_game.pgn_moves)
+                hashes[db_game.id] = (
+                    move_codec.game_columns(game_data)["content_hash"]
+                    or move_codec.pgn_text_hash(db_game.pgn_moves)
+                )
+        known = set(
+            db.query(models.Game.user_id, models.Game.content_hash)
+            .filter(
+                models.Game.user_id.in_({g.user_id for g in rows}),
+                models.Game.content_hash.in_(set(hashes.values())),
+            )
+            .all()
+        )
+
+        for db_game in rows:
+            key = (db_game.user_id, hashes[db_game.id])
+            if key in known:
+                duplicates += 1
+                if delete_duplicates:
+                    db.query(models.GameFeatures).filter(models.GameFeatures.game_id == db_game.id).delete()
+                    db.query(models.GamePosition).filter(models.GamePosition.game_id == db_game.id).delete()
+                    db.delete(db_game)
+                    affected_users.add(db_game.user_id)
+                continue
+            known.add(key)
+            db_game.content_hash = key[1]
+            hashed += 1
+        db.commit()
+
+    for user_id in affected_users:
+        rebuild_user_analysis(db, user_id=user_id)
+        ai_agent.invalidate_user_profile(user_id)
+        bump_analysis_version(user_id)
+    return {"hashed": hashed, "duplicates": duplicates, "deleted": duplicates if delete_duplicates else 0}
+
+def get_user_games(db: Session, user_id: int, limit: int = None, after_id: int = None, newest_first: bool = False):
+    """
+    Fetches games for a specific user, oldest first (or newest first).
+    Pass the last id you received as `after_id` to get the next page (keyset pagination).
+    """
+    query = db.query(models.Game).filter(models.Game.user_id == user_id)
+    return _games_page(query, limit, after_id, newest_first)
+
+def get_user_game_summaries(db: Session, user_id: int, limit: int = None, after_id: int = None, newest_first: bool = False):
+    """
+    Like get_user_games, but only reads the small columns (no PGN text).
+    """
+    query = (
+        db.query(
+            models.Game.id,
+            models.Game.user_id,
+            models.GameFeatures.ply_count,
+            models.GameFeatures.first_move_san,
+        )
+        .outerjoin(models.GameFeatures)
+        .filter(models.Game.user_id == user_id)
+    )
+    return _games_page(query, limit, after_id, newest_first)
+
+def _games_page(query, limit: int, after_id: int, newest_first: bool):
+    """One keyset page by game id; `after_id` continues in the chosen direction."""
+    if newest_first:
+        if after_id is not None:
+            query = query.filter(models.Game.id < after_id)
+        query = query.order_by(models.Game.id.desc())
+    else:
+        if after_id is not None:
+            query = query.filter(models.Game.id > after_id)
+        query = query.order_by(models.Game.id)
+    if limit is not None:
+        query = query.limit(limit)
+    with metrics.span("db.games_page"):
+        return query.all()
+
+def find_games_by_position(db: Session, user_id: int, zobrist: int, limit: int = None, after_id: int = None):
+    """
+    The user's games that reached the position with this Zobrist key, oldest first,
+    as (game, plies) pairs. Both queries are served by ix_game_positions_user_id_zobrist.
+    """
+    query = (
+        db.query(models.GamePosition.game_id)
+        .filter(models.GamePosition.user_id == user_id, models.GamePosition.zobrist == zobrist)
+        .distinct()
+    )
+    if after_id is not None:
+        query = query.filter(models.GamePosition.game_id > after_id)
+    query = query.order_by(models.GamePosition.game_id)
+    if limit is not None:
+        query = query.limit(limit)
+    with metrics.span("db.position_lookup"):
+        game_ids = [row.game_id for row in query.all()]
+        if not game_ids:
+            return []
+        plies = {}
+        for row in (
+            db.query(models.GamePosition.game_id, models.GamePosition.ply)
+            .filter(
+                models.GamePosition.user_id == user_id,
+                models.GamePosition.zobrist == zobrist,
+                models.GamePosition.game_id.in_(game_ids),
+            )
+            .order_by(models.GamePosition.game_id, models.GamePosition.ply)
+        ):
+            plies.setdefault(row.game_id, []).append(row.ply)
+        games = (
+            db.query(models.Game.id, models.Game.white_player, models.Game.black_player, models.Game.result)
+            .filter(models.Game.id.in_(game_ids))
+            .order_by(models.Game.id)
+            .all()
+        )
+    return [(game, plies[game.id]) for game in games]
+
+def backfill_game_positions(db: Session, batch_size: int = IMPORT_BATCH_SIZE):
+    """
+    One-off job: writes position index rows for games saved before the index existed.
+    Every indexed game has at least its ply-0 row, so reruns skip finished games.
+    """
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(models.Game)
+            .outerjoin(models.GamePosition, (models.GamePosition.game_id == models.Game.id) & (models.GamePosition.ply == 0))
+            .filter(models.GamePosition.game_id.is_(None), models.Game.id > last_id)
+            .order_by(models.Game.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        with metrics.span("pgn.replay"):
+            for db_game in rows:
+                if db_game.moves_packed:
+                    keys = positions.packed_keys(db_game.moves_packed, db_game.start_fen)
+                else:
+                    game_data = analysis.parse_pgn(db_game.pgn_moves)
+                    if game_data is None:
+                        continue
+                    keys = positions.game_keys(game_data)
+                _insert_positions(db, db_game.user_id, [(db_game.id, keys)])
+                indexed += 1
+        db.commit()
+    return indexed
 
 #-----------------------ANALYZE--------------------------------
 
-def analyze_user_games(db: Session, user_id: int):
+def get_user_analysis(db: Session, user_id: int, for_update: bool = False):
+    """Fetches the running analysis totals for a user (or None)."""
+    query = db.query(models.UserAnalysis).filter(models.UserAnalysis.user_id == user_id)
+    if for_update:
+        # Lock the row so concurrent game saves don't lose updates, and re-read it
+        query = query.with_for_update().populate_existing()
+    return query.first()
+
+def _lock_user_analysis(db: Session, user_id: int):
+    """
+    Returns (row, created): the user's totals row, locked, after creating it if
+    missing. INSERT ... ON CONFLICT DO NOTHING lets concurrent first saves both
+    go through; the loser waits for the winner's row and then locks it.
+    """
+    created = db.execute(
+        database.dialect_insert(db)(models.UserAnalysis)
+        .values(
+            user_id=user_id,
+            total_games=0,
+            aggressive_score=0,
+            defensive_score=0,
+            opening_counts={},
+            opening_name_counts={},
+        )
+        .on_conflict_do_nothing()
+    ).rowcount == 1
+    return get_user_analysis(db, user_id=user_id, for_update=True), created
+
+def add_games_to_analysis(db: Session, user_id: int, features_list: list):
+    """
+    Adds the features of newly saved games (outputs of analysis.extract_features)
+    to the user's totals. The games and their features must already be flushed.
+    Does not commit; the caller owns the transaction.
+    """
+    db_analysis, created = _lock_user_analysis(db, user_id)
+    before = population.per_game_values(
+        db_analysis.total_games, db_analysis.aggressive_score, db_analysis.defensive_score
+    )
+    if created:
+        # First totals for this user: count every stored game, not just the new ones.
+        # The new games' features are already flushed, so they are included too.
+        _recompute_user_analysis(db, db_analysis, user_id)
+    else:
+        # Assign new dicts at the end so SQLAlchemy notices the JSON change
+        counts = dict(db_analysis.opening_counts or {})
+        name_counts = dict(db_analysis.opening_name_counts or {})
+        for features in features_list:
+            # Unparseable games still count towards the total, as they always have
+            db_analysis.total_games += 1
+            db_analysis.aggressive_score += analysis.aggressive_score(features["captures"], features["checks"])
+            db_analysis.defensive_score += analysis.defensive_score(features["castles"])
+            if features["first_move_san"]:
+                counts[features["first_move_san"]] = counts.get(features["first_move_san"], 0) + 1
+            label = analysis.opening_label(features)
+            if label:
+                name_counts[label] = name_counts.get(label, 0) + 1
+        db_analysis.opening_counts = counts
+        db_analysis.opening_name_counts = name_counts
+    # Keep this worker's population histograms current until the next refresh
+    population.record_change(before, population.per_game_values(
+        db_analysis.total_games, db_analysis.aggressive_score, db_analysis.defensive_score
+    ))
+    return db_analysis
+
+def backfill_game_features(db: Session, user_id: int):
+    """
+    Extracts features for any of the user's games saved before game_features existed.
+    Does not commit; the caller owns the transaction.
+    """
+    with metrics.span("db.missing_features"):
+        missing = (
+            db.query(models.Game)
+            .outerjoin(models.GameFeatures)
+            .filter(models.Game.user_id == user_id, models.GameFeatures.game_id.is_(None))
+            .all()
+        )
+    # Games with packed moves replay cheaply inline; large PGN-only backlogs
+    # go through the analysis engine's process pool
+    packed = [g for g in missing if g.moves_packed is not None]
+    pgn_only = [g for g in missing if g.moves_packed is None]
+    with metrics.span("pgn.replay"):
+        for db_game in packed:
+            features = analysis.extract_packed_features(db_game.moves_packed, db_game.start_fen)
+            db.add(models.GameFeatures(game_id=db_game.id, user_id=user_id, **features))
+        features_list = analysis_engine.extract_features_many([g.pgn_moves for g in pgn_only])
+        for db_game, features in zip(pgn_only, features_list):
+            db.add(models.GameFeatures(game_id=db_game.id, user_id=user_id, **features))
+    db.flush()
+    return len(missing)
+
+def rebuild_user_analysis(db: Session, user_id: int):
     """
-    Analyzes all games for a user and returns a personality report.
+    Recomputes a user's analysis totals and trend rollups from their stored game features.
+    Used for users created before the totals existed, and by the admin rebuild endpoint.
     """
-    # 1. Get all games for the user
-    games = get_user_games(db, user_id=user_id)
-    
+    db_analysis, _ = _lock_user_analysis(db, user_id)
+    _recompute_user_analysis(db, db_analysis, user_id)
+    with metrics.span("db.rollups"):
+        trends.rebuild_rollups(db, user_id=user_id)
+    db.commit()
+    db.refresh(db_analysis)
+    return db_analysis
+
+def _recompute_user_analysis(db: Session, db_analysis: models.UserAnalysis, user_id: int):
+    """Sets the totals on a locked row from the user's stored game features. Does not commit."""
+    backfill_game_features(db, user_id=user_id)
+
+    # Sum the per-game columns in the database instead of replaying PGNs
+    with metrics.span("db.aggregate"):
+        totals = (
+            db.query(
+                func.count(models.GameFeatures.game_id),
+                func.coalesce(func.sum(models.GameFeatures.captures), 0),
+                func.coalesce(func.sum(models.GameFeatures.checks), 0),
+                func.coalesce(func.sum(models.GameFeatures.castles), 0),
+            )
+            .filter(models.GameFeatures.user_id == user_id)
+            .one()
+        )
+        opening_rows = (
+            db.query(models.GameFeatures.first_move_san, func.count())
+            .filter(
+                models.GameFeatures.user_id == user_id,
+                models.GameFeatures.first_move_san.isnot(None),
+            )
+            .group_by(models.GameFeatures.first_move_san)
+            .all()
+        )
+        # Same labels as analysis.opening_label
+        opening_label = func.coalesce(models.GameFeatures.opening_name, models.GameFeatures.first_move_san)
+        opening_name_rows = (
+            db.query(opening_label, func.count())
+            .filter(
+                models.GameFeatures.user_id == user_id,
+                opening_label.isnot(None),
+            )
+            .group_by(opening_label)
+            .all()
+        )
+
+    total_games, captures, checks, castles = totals
+    db_analysis.total_games = total_games
+    db_analysis.aggressive_score = analysis.aggressive_score(captures, checks)
+    db_analysis.defensive_score = analysis.defensive_score(castles)
+    db_analysis.opening_counts = {san: count for san, count in opening_rows}
+    db_analysis.opening_name_counts = {name: count for name, count in opening_name_rows}
+
+def rebuild_all_user_analysis(db: Session):
+    """Recomputes the analysis totals for every user. Returns the number of users rebuilt."""
+    user_ids = [row.id for row in db.query(models.User.id).all()]
+    for user_id in user_ids:
+        rebuild_user_analysis(db, user_id=user_id)
+    return len(user_ids)
+
+def summarize_user_analysis(db: Session, user_id: int):
+    """
+    The numeric part of a user's report, without the AI text.
+    Returns (result, pgn_samples, stats); the samples and stats are what the AI
+    profile is generated from, and `pgn_samples` is empty when there are no games.
+    """
+    # 1. Get the running totals for the user
+    with metrics.span("db.analysis_totals"):
+        db_analysis = get_user_analysis(db, user_id=user_id)
+    if db_analysis is None:
+        # Users whose games predate the totals table get them built once here
+        db_analysis = rebuild_user_analysis(db, user_id=user_id)
+
     # --- HANDLE NO GAMES CASE ---
-    if not games:
+    if not db_analysis.total_games:
         return schemas.AnalysisResult(
             total_games=0,
             aggressive_score=0,
@@ -67,85 +660,81 @@ def analyze_user_games(db: Session, user_id: int):
             personality_type="Not Enough Data",
             celebrity_match="Play a few games to find out!",
             ai_report="Play some games to generate a psychological profile!"
-        )
-
-    # 2. Initialize analysis variables
-    total_games = len(games)
-    aggressive_score = 0
-    defensive_score = 0
-    opening_moves = []
+        ), [], {}
 
-    # 3. Loop through each game and analyze
-    for game in games:
-        pgn = io.StringIO(game.pgn_moves)
-        
-        try:
-            game_data = chess.pgn.read_game(pgn)
-            
-            if game_data:
-                # FIX: Create a board object to track the state
-                board = game_data.board() 
-                all_moves = list(game_data.mainline_moves())
-
-                if all_moves:
-                    # Store first move for opening preference
-                    first_move = board.san(all_moves[0])
-                    opening_moves.append(first_move)
-                
-                    for move in all_moves:
-                        # --- Analyze BEFORE pushing the move ---
-                        
-                        # Check for captures
-                        if board.is_capture(move):
-                            aggressive_score += 0.5
-                        
-                        # Check for castling (defensive)
-                        if board.is_castling(move):
-                            defensive_score += 1
-
-                        # --- Make the move on our board ---
-                        board.push(move)
-
-                        # --- Analyze AFTER pushing the move ---
-                        
-                        # Did this move put the opponent in check?
-                        if board.is_check():
-                            aggressive_score += 1
-                            
-        except Exception as e:
-            print(f"Error parsing PGN: {e}") 
-            continue
-
-    # 4. Determine personality based on scores
-    personality_type = "Balanced"
-    celebrity_match = "Magnus Carlsen"
-
-    if aggressive_score > (defensive_score * 1.5):
-        personality_type = "Aggressive Attacker"
-        celebrity_match = "Mikhail Tal"
-    elif defensive_score > (aggressive_score * 1.5):
-        personality_type = "Solid Defender"
-        celebrity_match = "Tigran Petrosian"
+    # 2. Determine personality based on scores
+    aggressive_score = db_analysis.aggressive_score
+    defensive_score = db_analysis.defensive_score
+    personality_type, celebrity_match = analysis.classify_personality(aggressive_score, defensive_score)
+    # Games outside the ECO table are counted by their first move in the same histogram.
+    # Totals stored before that lack those entries until rebuilt (POST /admin/analysis/rebuild);
+    # one without any named game falls back to the first-move histogram.
+    opening_distribution = db_analysis.opening_name_counts or {}
+    opening_preference = analysis.most_common_opening(opening_distribution or db_analysis.opening_counts)
 
-    opening_preference = "Varies"
-    if opening_moves:
-        opening_preference = max(set(opening_moves), key=opening_moves.count)
-
-    # 5. CALL THE AI AGENT
-    pgn_samples = [g.pgn_moves for g in games[:5]]
+    # 3. Sample games for the AI agent
+    with metrics.span("db.sample_games"):
+        sample_games = (
+            db.query(models.Game.pgn_moves)
+            .filter(models.Game.user_id == user_id)
+            .order_by(models.Game.id)
+            .limit(5)
+            .all()
+        )
+    pgn_samples = [g.pgn_moves for g in sample_games]
     current_stats = {
         "aggressive_score": aggressive_score,
         "defensive_score": defensive_score
     }
-    
-    ai_text = ai_agent.generate_psychological_profile(pgn_samples, current_stats)
 
-    return schemas.AnalysisResult(
-        total_games=total_games,
+    # Compare against everyone else via the precomputed population histograms
+    with metrics.span("db.population"):
+        ranks = population.percentiles(db, population.per_game_values(
+            db_analysis.total_games, aggressive_score, defensive_score
+        ))
+
+    result = schemas.AnalysisResult(
+        total_games=db_analysis.total_games,
         aggressive_score=int(aggressive_score),
         defensive_score=int(defensive_score),
+        aggressive_percentile=ranks["aggressive_per_game"],
+        defensive_percentile=ranks["defensive_per_game"],
         opening_preference=opening_preference,
+        opening_distribution=opening_distribution,
         personality_type=personality_type,
         celebrity_match=celebrity_match,
-        ai_report=ai_text 
-    )
\ No newline at end of file
+        ai_report="",
+        ai_report_status=jobs.PENDING
+    )
+    return result, pgn_samples, current_stats
+
+def analyze_user_games(db: Session, user_id: int):
+    """
+    Returns a personality report for a user.
+    Reads the stored analysis totals instead of replaying every game.
+    The AI report comes from the cache if possible; otherwise it is queued as a
+    background job and `ai_report_job_id` tells the client what to poll.
+    Concurrent calls for the same user and data version share one computation.
+    """
+    if not ANALYSIS_SINGLEFLIGHT:
+        return _analyze_user_games(db, user_id)
+    key = (user_id, _analysis_versions.get(user_id, 0))
+    return analysis_flight.do(key, _analyze_user_games, db, user_id)
+
+def _analyze_user_games(db: Session, user_id: int):
+    result, pgn_samples, current_stats = summarize_user_analysis(db, user_id)
+    if not pgn_samples:
+        return result
+
+    with metrics.span("ai.cache_lookup"):
+        ai_text = ai_agent.get_cached_profile(pgn_samples, current_stats)
+    if ai_text is not None:
+        return result.model_copy(update={"ai_report": ai_text, "ai_report_status": jobs.DONE})
+
+    # Don't make the client wait on Gemini; hand back a job to poll instead
+    job = jobs.submit_profile_job(user_id, pgn_samples, current_stats)
+    return result.model_copy(update={
+        "ai_report": "Your psychological profile is being generated...",
+        "ai_report_status": job["status"],
+        "ai_report_job_id": job["job_id"],
+    })
@@ -0,0 +1,187 @@
+import os
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Get the database URL from the environment variable
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+if DATABASE_URL is None:
+    print("Error: DATABASE_URL environment variable not set.")
+    exit(1) # Exit if database URL is not found
+
+# --- Connection Pool Settings ---
+# Size these against Postgres' max_connections:
+# (DB_POOL_SIZE + DB_MAX_OVERFLOW) * number of worker processes must fit.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30)) # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800)) # Reconnect connections older than this (seconds)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true" # Drop dead connections before use
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0)) # 0 disables it (Postgres only)
+
+# Create missing tables when the app starts. Turn off in production and run
+# `python database.py` (or your migration tool) as a deploy step instead.
+AUTO_CREATE_SCHEMA = os.getenv("AUTO_CREATE_SCHEMA", "true").lower() == "true"
+
+# Optional async driver URL for async routes, e.g. postgresql+asyncpg://... or sqlite+aiosqlite:///...
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+
+def _engine_options(url: str) -> dict:
+    """Keyword arguments for create_engine/create_async_engine, based on the backend."""
+    if url.startswith("sqlite"):
+        # SQLite has no server-side pool to tune
+        return {"connect_args": {"check_same_thread": False}}
+
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        if "+asyncpg" in url:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+# Create the SQLAlchemy engine
+# The engine is the starting point for any SQLAlchemy application.
+# It's the home base for the actual database and its DBAPI.
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+# Create a SessionLocal class
+# This class will serve as a factory for new Session objects.
+# A Session manages persistence operations for ORM-mapped objects.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# --- Optional Async Engine ---
+# Only created when ASYNC_DATABASE_URL is set (needs asyncpg or aiosqlite installed).
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DATABASE_URL:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def init_db():
+    """
+    Creates the database tables.
+    This checks if the tables exist and creates them if they don't, then brings
+    existing tables up to date (see _upgrade_existing_tables).
+    """
+    import models # Imported here so `python database.py` works without the app
+    existing_tables = set(inspect(engine).get_table_names())
+    models.Base.metadata.create_all(bind=engine)
+    _upgrade_existing_tables(models.Base.metadata, existing_tables)
+
+
+def _upgrade_existing_tables(metadata, existing_tables: set):
+    """
+    create_all never alters a table that already exists, so columns and indexes
+    added to models later (e.g. games.moves_packed, content_hash, played_at) are
+    added here. Only nullable columns can be added this way; anything else needs
+    a hand-written migration and is reported instead.
+    """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                if not column.nullable:
+                    print(f"Schema Warning: {table.name}.{column.name} is missing and NOT NULL; add it by hand.")
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"
+                ))
+                print(f"Added column {table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def dialect_insert(db):
+    """
+    The backend-specific `insert` construct for a session (PostgreSQL or SQLite),
+    which adds on_conflict_do_nothing/on_conflict_do_update for upserts.
+    """
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"No upsert support for {name}")
+    return insert
+
+
+def get_db():
+    """
+    Dependency function to get a database session.
+    This will be called for each request that needs a database connection.
+    It ensures the session is properly closed after the request.
+    """
+    db = SessionLocal()
+    try:
+        yield db # Provide the session to the path operation function
+    finally:
+        db.close() # Close the session after the request is finished
+
+
+async def get_async_db():
+    """
+    Async counterpart of get_db, for `async def` routes.
+    Requires ASYNC_DATABASE_URL to be configured.
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("ASYNC_DATABASE_URL is not configured")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _pool_status(pool) -> dict:
+    """Connection counts for one pool (SQLite's pools don't report them)."""
+    status = {"pool_class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            status[name] = counter()
+    return status
+
+
+def pool_status() -> dict:
+    """Current connection pool usage, for sizing workers against the DB's connection limit."""
+    status = {
+        "sync": _pool_status(engine.pool),
+        "settings": {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+            "statement_timeout_ms": DB_STATEMENT_TIMEOUT_MS,
+        },
+    }
+    if async_engine is not None:
+        status["async"] = _pool_status(async_engine.pool)
+    return status
+
+
+if __name__ == "__main__":
+    # Explicit schema step for deploys: python database.py
+    init_db()
+    print("Database schema is up to date.")
@@ -0,0 +1,62 @@
+import io
+import json
+import chess.pgn
+from pydantic import ValidationError
+import schemas
+
+# --- Bulk Import Parsing ---
+# Each generator reads one game at a time from a text stream, so an upload
+# with thousands of games never has to be held in memory at once.
+# They yield (pgn_text, game_data, error): a parsed game, or an error message.
+
+
+def _check_game(game_data):
+    """Returns an error message for a game we shouldn't store, or None."""
+    if game_data.errors:
+        return f"illegal or unparseable move: {game_data.errors[0]}"
+    if game_data.next() is None:
+        return "game has no moves"
+    return None
+
+
+def iter_pgn_games(text_stream):
+    """Reads a multi-game PGN file game by game."""
+    while True:
+        try:
+            game_data = chess.pgn.read_game(text_stream)
+        except Exception as e:
+            yield None, None, f"could not parse game: {e}"
+            continue
+        if game_data is None:
+            return # End of file
+        error = _check_game(game_data)
+        if error:
+            yield None, None, error
+        else:
+            yield str(game_data), game_data, None
+
+
+def iter_ndjson_games(text_stream):
+    """Reads one JSON object per line, each shaped like schemas.GameCreate."""
+    for line in text_stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            game = schemas.GameCreate.model_validate(json.loads(line))
+        except (ValueError, ValidationError) as e:
+            yield None, None, f"invalid JSON line: {e}"
+            continue
+        try:
+            game_data = chess.pgn.read_game(io.StringIO(game.pgn_moves))
+        except Exception as e:
+            yield None, None, f"could not parse game: {e}"
+            continue
+        if game_data is None:
+            yield None, None, "empty PGN"
+            continue
+        error = _check_game(game_data)
+        if error:
+            yield None, None, error
+        else:
+            yield game.pgn_moves, game_data, None
@@ -0,0 +1,95 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from dotenv import load_dotenv
+import ai_agent
+import profile_cache
+
+load_dotenv()
+
+# --- Background AI Jobs ---
+# The Gemini call takes seconds, so it runs on this worker pool instead of
+# inside the request. Clients poll GET /users/me/analysis/jobs/{job_id}.
+# Job records live in this process's memory: polling needs a single worker
+# process (or sticky routing). A poll that reaches another worker, or comes
+# after a restart or AI_JOB_RETENTION_SECONDS, gets a 404; clients should then
+# request the analysis again, which finds the report in the profile cache
+# (use AI_CACHE_BACKEND=database across workers) or starts a new job.
+AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", 4))
+AI_JOB_RETENTION_SECONDS = int(os.getenv("AI_JOB_RETENTION_SECONDS", 900)) # How long finished jobs stay pollable
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+executor = ThreadPoolExecutor(max_workers=AI_JOB_WORKERS, thread_name_prefix="ai-job")
+
+_jobs = TTLCache(maxsize=10000, ttl=AI_JOB_RETENTION_SECONDS) # job_id -> job dict
+_jobs_by_key = {} # user id + prompt digest -> job_id, for jobs still in flight
+_lock = threading.Lock()
+
+
+def submit_profile_job(user_id: int, pgn_list: list, stats: dict) -> dict:
+    """
+    Queues an AI profile for generation and returns the job record.
+    A request for the same inputs while a job is in flight reuses that job.
+    """
+    key = f"{user_id}:{profile_cache.make_cache_key(pgn_list[:3], stats)}"
+    with _lock:
+        job_id = _jobs_by_key.get(key)
+        if job_id in _jobs:
+            return dict(_jobs[job_id])
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "status": PENDING,
+            "ai_report": None,
+        }
+        _jobs[job["job_id"]] = job
+        _jobs_by_key[key] = job["job_id"]
+        snapshot = dict(job)
+
+    executor.submit(_run_profile_job, job["job_id"], key, user_id, pgn_list, stats)
+    return snapshot
+
+
+def get_job(job_id: str):
+    """Returns a copy of the job record, or None if it is unknown or has expired."""
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def job_counts() -> dict:
+    """Number of known jobs per status, for /metrics."""
+    counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+    with _lock:
+        for job in _jobs.values():
+            counts[job["status"]] += 1
+    return counts
+
+
+def _set_status(job_id: str, **fields):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job:
+            job.update(fields)
+
+
+def _run_profile_job(job_id: str, key: str, user_id: int, pgn_list: list, stats: dict):
+    """Worker body: calls the AI agent and stores the report on the job."""
+    _set_status(job_id, status=RUNNING)
+    try:
+        report = ai_agent.generate_psychological_profile(pgn_list, stats, user_id=user_id, raise_errors=True)
+        _set_status(job_id, status=DONE, ai_report=report)
+    except Exception as e:
+        print(f"AI Job Error: {e}")
+        _set_status(job_id, status=FAILED, ai_report="Could not generate profile at this time.")
+    finally:
+        with _lock:
+            if _jobs_by_key.get(key) == job_id:
+                del _jobs_by_key[key]
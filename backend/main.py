@@ -1,52 +1,69 @@
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+import anyio
+import io
+import json
 import os
-from fastapi import FastAPI, Depends, HTTPException, status, Form
+import time
+from fastapi import FastAPI, Depends, HTTPException, status, Form, UploadFile, File, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from datetime import timedelta
-from sqlalchemy import create_engine, text # Import 'text' for raw SQL
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import text # Import 'text' for raw SQL
+from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 import models
 import schemas 
+from database import SessionLocal, get_db
+import database
 import crud 
+import importer
 import security 
+import ai_agent
+import jobs
+import metrics
+import population
+import positions
+import profile_cache
+import trends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 
 from typing import Optional
 from jose import JWTError, jwt
 import schemas
 
-from typing import List
+from typing import List, Union
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Get the database URL from the environment variable
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Comma-separated usernames allowed to call the /admin endpoints
+ADMIN_USERNAMES = {
+    name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()
+}
 
-# --- Database Setup ---
-if DATABASE_URL is None:
-    print("Error: DATABASE_URL environment variable not set.")
-    # Handle the error appropriately, maybe exit or raise an exception
-    exit(1) # Exit if database URL is not found
-
-# Create the SQLAlchemy engine
-# The engine is the starting point for any SQLAlchemy application.
-# It's the home base for the actual database and its DBAPI.
-engine = create_engine(DATABASE_URL)
-
-# Create a SessionLocal class
-# This class will serve as a factory for new Session objects.
-# A Session manages persistence operations for ORM-mapped objects.
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# --- Added this ---
-
-# Create the database tables
-# This checks if the tables exist and creates them if they don't
-models.Base.metadata.create_all(bind=engine)
+# Share cached AI profiles between workers when asked to
+if ai_agent.AI_CACHE_BACKEND == "database":
+    ai_agent.set_cache(profile_cache.DatabaseProfileCache(
+        SessionLocal,
+        max_entries=ai_agent.AI_CACHE_MAX_ENTRIES,
+        ttl_seconds=ai_agent.AI_CACHE_TTL_SECONDS,
+    ))
 
 # --- FastAPI App ---
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup/shutdown hook. Schema creation happens here (not at import time),
+    and only when AUTO_CREATE_SCHEMA is on.
+    """
+    if database.AUTO_CREATE_SCHEMA:
+        await run_in_threadpool(database.init_db)
+    yield
+    # Don't hold up shutdown for queued AI jobs
+    jobs.executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
 
 # --- Add CORS Middleware ---
 origins = ["*"]
@@ -57,33 +74,61 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # Lets the browser read the pagination cursor
 )
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-# --- Dependency ---
-def get_db():
-    """
-    Dependency function to get a database session.
-    This will be called for each request that needs a database connection.
-    It ensures the session is properly closed after the request.
-    """
-    db = SessionLocal()
+# --- Request Timing ---
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Records every request's latency in http_request_duration_seconds."""
+    start = time.perf_counter()
+    status_code = 500
     try:
-        yield db # Provide the session to the path operation function
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
     finally:
-        db.close() # Close the session after the request is finished
+        # Label by route template (/games/{id}), not the raw path, to keep series bounded
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - start, request.method, route_path, str(status_code)
+        )
+
+def _runtime_gauges():
+    """Pool, hashing, analysis single-flight and job gauges (and counters) for /metrics."""
+    gauges = []
+    pool = database.pool_status()["sync"]
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if name in pool:
+            gauges.append((f"db_pool_{name}", f"SQLAlchemy pool {name}.", pool[name]))
+    hashing = security.hashing_stats()
+    gauges.append(("password_hash_pending", "Hashing calls running or queued.", hashing["pending"]))
+    gauges.append(("password_hash_queued", "Hashing calls waiting for a worker.", hashing["queued"]))
+    gauges.append(("password_hash_rejected_total", "Hashing calls rejected because the pool was full.", hashing["rejected"], "counter"))
+    flight = crud.analysis_flight.stats()
+    gauges.append(("analysis_requests_executed_total", "Analysis computations actually run.", flight["executed"], "counter"))
+    gauges.append(("analysis_requests_coalesced_total", "Analysis requests that shared an in-flight computation.", flight["coalesced"], "counter"))
+    for job_status, count in jobs.job_counts().items():
+        gauges.append((f"ai_jobs_{job_status}", f"AI profile jobs currently {job_status}.", count))
+    return gauges
+
+metrics.register_gauges(_runtime_gauges)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 ##########
 
-async def get_current_user(
+def get_current_user(
     token: str = Depends(oauth2_scheme), 
     db: Session = Depends(get_db)
 ):
     """
     Dependency to get the current user from a JWT token.
+    A plain `def`, so the DB lookup runs in the threadpool rather than on the event loop.
     1. Gets token string from the request (via oauth2_scheme).
     2. Decodes and verifies the token.
-    3. Fetches the user from the database.
+    3. Fetches the user from the auth cache, or the database on a miss.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -100,16 +145,42 @@ async def get_current_user(
         username: Optional[str] = payload.get("sub")
         if username is None:
             raise credentials_exception
-        # Find the user in the database
-        user = crud.get_user_by_username(db, username=username)
+        # Find the user (cached for a short while, see crud.get_cached_user)
+        user = crud.get_cached_user(db, username=username)
         if user is None:
             raise credentials_exception
-        # Return the user object
+        # Return the user snapshot (id and username)
         return user
     except JWTError:
         # If token is invalid (expired, wrong signature, etc.)
         raise credentials_exception
 
+async def get_current_admin_user(current_user: schemas.User = Depends(get_current_user)):
+    """
+    Dependency that only lets through users listed in ADMIN_USERNAMES.
+    """
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required",
+        )
+    return current_user
+
+def hashing_overloaded_exception():
+    """503 returned when the password hashing pool is saturated."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+async def hash_password_or_503(password: str) -> str:
+    """Hashes on the hashing pool, turning overload into a 503."""
+    try:
+        return await security.get_password_hash_async(password)
+    except security.HashingOverloaded:
+        raise hashing_overloaded_exception()
+
 # --- API Endpoints ---
 @app.get("/")
 def read_root():
@@ -118,6 +189,13 @@ def read_root():
     """
     return {"message": "Welcome to the Chess App API!"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """
+    Request and stage latency histograms plus pool/job gauges, in Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/db-check")
 def check_db_connection(db: Session = Depends(get_db)):
     """
@@ -134,16 +212,18 @@ def check_db_connection(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
 
 @app.post("/users/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """
     Registers a new user.
+    The DB work runs in the threadpool and hashing on the hashing pool, so neither blocks the event loop.
     """
     # Check if user already exists
-    db_user = crud.get_user_by_username(db, username=user.username)
+    db_user = await run_in_threadpool(crud.get_user_by_username, db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     # Create the new user
-    created_user = crud.create_user(db=db, user=user)
+    hashed_password = await hash_password_or_503(user.password)
+    created_user = await run_in_threadpool(crud.create_user, db, user, hashed_password)
     return created_user
 
 
@@ -155,8 +235,12 @@ async def login_for_access_token(
     """
     Handles user login and returns a JWT token.
     Uses OAuth2PasswordRequestForm for standard form data input (username/password).
+    Password checks run on the bounded hashing pool; a saturated pool answers 503.
     """
-    user = crud.authenticate_user(db, username=form_data.username, password=form_data.password)
+    try:
+        user = await crud.authenticate_user_async(db, username=form_data.username, password=form_data.password)
+    except security.HashingOverloaded:
+        raise hashing_overloaded_exception()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -172,47 +256,269 @@ async def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/users/me", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: schemas.User = Depends(get_current_user)):
     """
     Fetches the profile of the currently logged-in user.
     This endpoint is protected; it requires a valid JWT token.
     """
     # Because of `Depends(get_current_user)`, this code will
     # only run if the token is valid.
-    # The `current_user` variable will be the user object
-    # from the database.
+    # The `current_user` variable will be the user snapshot
+    # (id and username) resolved from the token.
     return current_user
 
 @app.post("/games/", response_model=schemas.Game, status_code=status.HTTP_201_CREATED)
-async def create_game_for_user(
+def create_game_for_user(
     game: schemas.GameCreate, 
-    current_user: models.User = Depends(get_current_user), 
+    response: Response,
+    current_user: schemas.User = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     """
     Saves a new game for the currently logged-in user.
+    Resubmitting a game the user already has returns the saved one with 200 instead of 201.
     """
     # The user's ID is taken from the token (via get_current_user)
-    return crud.create_user_game(db=db, game=game, user_id=current_user.id)
+    db_game, created = crud.create_user_game(db=db, game=game, user_id=current_user.id)
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return db_game
 
-@app.get("/games/", response_model=List[schemas.Game])
-async def read_user_games(
-    current_user: models.User = Depends(get_current_user), 
+@app.post("/games/import", response_model=schemas.GameImportResult)
+def import_games_for_user(
+    file: UploadFile = File(...),
+    current_user: schemas.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Fetches all saved games for the currently logged-in user.
+    Bulk-imports games for the currently logged-in user.
+    Accepts a multi-game .pgn file, or .ndjson/.jsonl with one {"pgn_moves": ...} object per line.
+    The upload is parsed one game at a time and saved in batches.
+    """
+    # The upload is spooled to disk by Starlette; wrap it so we can read it as text
+    text_stream = io.TextIOWrapper(file.file, encoding="utf-8", errors="replace")
+    filename = (file.filename or "").lower()
+    if filename.endswith((".ndjson", ".jsonl")) or file.content_type == "application/x-ndjson":
+        parsed_games = importer.iter_ndjson_games(text_stream)
+    else:
+        parsed_games = importer.iter_pgn_games(text_stream)
+    return crud.import_user_games(db=db, parsed_games=parsed_games, user_id=current_user.id)
+
+@app.get("/games/", response_model=List[Union[schemas.GameSummary, schemas.Game]])
+def read_user_games(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    after_id: Optional[int] = None,
+    summary: bool = False,
+    newest_first: bool = False,
+    current_user: schemas.User = Depends(get_current_user), 
+    db: Session = Depends(get_db)
+):
     """
-    games = crud.get_user_games(db=db, user_id=current_user.id)
+    Fetches a page of saved games for the currently logged-in user, oldest first
+    (`newest_first=true` reverses that).
+    When there are more games, the X-Next-Cursor header holds the `after_id` for the next page.
+    `summary=true` leaves out the PGN text.
+    """
+    if summary:
+        rows = crud.get_user_game_summaries(
+            db=db, user_id=current_user.id, limit=limit, after_id=after_id, newest_first=newest_first
+        )
+        games = [schemas.GameSummary.model_validate(row) for row in rows]
+    else:
+        rows = crud.get_user_games(
+            db=db, user_id=current_user.id, limit=limit, after_id=after_id, newest_first=newest_first
+        )
+        games = [schemas.Game.model_validate(row) for row in rows]
+
+    # A full page means there may be more
+    if len(games) == limit:
+        response.headers["X-Next-Cursor"] = str(games[-1].id)
     return games
 
+@app.get("/games/positions", response_model=List[schemas.PositionMatch])
+def search_games_by_position(
+    response: Response,
+    fen: str,
+    limit: int = Query(50, ge=1, le=500),
+    after_id: Optional[int] = None,
+    current_user: schemas.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Finds the logged-in user's games that reached the position in `fen`, and at which plies.
+    Move counters in the FEN are ignored. Paginated like GET /games/ (X-Next-Cursor).
+    """
+    try:
+        zobrist = positions.fen_key(fen)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid FEN")
+    matches = crud.find_games_by_position(
+        db=db, user_id=current_user.id, zobrist=zobrist, limit=limit, after_id=after_id
+    )
+    if len(matches) == limit:
+        response.headers["X-Next-Cursor"] = str(matches[-1][0].id)
+    return [
+        schemas.PositionMatch(
+            game_id=game.id,
+            plies=plies,
+            white_player=game.white_player,
+            black_player=game.black_player,
+            result=game.result,
+        )
+        for game, plies in matches
+    ]
+
 @app.get("/users/me/analysis", response_model=schemas.AnalysisResult)
-async def read_user_analysis(
-    current_user: models.User = Depends(get_current_user), 
+def read_user_analysis(
+    current_user: schemas.User = Depends(get_current_user), 
     db: Session = Depends(get_db)
 ):
     """
     Gets the chess personality analysis for the currently logged-in user.
+    Declared with plain `def` so FastAPI runs the blocking DB work in its threadpool.
+    If the AI report isn't cached yet, poll the returned `ai_report_job_id`.
+    """
+    # Sampled cProfile dump when ANALYSIS_PROFILE_SAMPLE_RATE is set
+    with metrics.maybe_profile("analysis"):
+        analysis = crud.analyze_user_games(db=db, user_id=current_user.id)
+    return analysis
+
+def _sse(event: str, data) -> str:
+    """Formats one Server-Sent Event; `data` is sent as JSON."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that always closes its body generator. Starlette leaves the
+    generator suspended at its `yield` when the client disconnects mid-send, so its
+    `finally` would otherwise wait for the garbage collector.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+
+@app.get("/users/me/analysis/stream")
+async def stream_user_analysis(
+    request: Request,
+    current_user: schemas.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-Sent Events version of /users/me/analysis.
+    Sends the numeric report straight away as an `analysis` event, then the AI
+    report as `token` events while Gemini writes it, then `done`.
+    Generation stops if the client disconnects.
+    """
+    result, pgn_samples, current_stats = await run_in_threadpool(
+        crud.summarize_user_analysis, db, current_user.id
+    )
+
+    async def events():
+        yield _sse("analysis", result.model_dump())
+        if not pgn_samples:
+            yield _sse("done", {})
+            return
+        chunks = ai_agent.stream_psychological_profile(pgn_samples, current_stats, user_id=current_user.id)
+        try:
+            while not await request.is_disconnected():
+                # The SDK's stream is blocking, so each chunk is pulled in the threadpool.
+                # Cancellation waits for an in-flight next() to return, so the generator
+                # is never running when it gets closed below.
+                chunk = await run_in_threadpool(next, chunks, None)
+                if chunk is None:
+                    yield _sse("done", {})
+                    break
+                yield _sse("token", chunk)
+        finally:
+            # Reached on disconnect too (see ClosingStreamingResponse). Closing the
+            # generator ends the Gemini stream; shielded so cancellation can't skip it.
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(chunks.close)
+
+    return ClosingStreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/users/me/analysis/trend", response_model=schemas.TrendResult)
+def read_user_trend(
+    period: str = Query("week", pattern="^(day|week)$"),
+    limit: int = Query(12, ge=1, le=366),
+    games: Optional[int] = Query(None, ge=1),
+    current_user: schemas.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Aggression and defence per game over the user's last `limit` active days/weeks,
+    or, with `games`, over enough recent ones to cover that many games.
+    Reads only the precomputed rollup rows.
+    """
+    with metrics.span("db.trend"):
+        points = trends.get_trend(db, user_id=current_user.id, period=period, limit=limit, games=games)
+    return {"period": period, "points": points}
+
+@app.get("/users/me/analysis/jobs/{job_id}", response_model=schemas.AnalysisJob)
+async def read_analysis_job(
+    job_id: str,
+    current_user: schemas.User = Depends(get_current_user)
+):
+    """
+    Polls a background AI profile job started by /users/me/analysis.
+    Jobs are held in memory by the worker process that started them (see jobs.py),
+    so an unknown or expired job is a 404 and the client should re-request the analysis.
+    """
+    job = jobs.get_job(job_id)
+    # Don't reveal other users' jobs
+    if job is None or job["user_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/admin/analysis/rebuild", response_model=schemas.AnalysisRebuildResult)
+def rebuild_analysis(
+    user_id: Optional[int] = None,
+    admin_user: schemas.User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Recomputes the stored analysis totals from the raw games.
+    Rebuilds a single user if `user_id` is given, otherwise every user.
+    """
+    if user_id is not None:
+        if db.get(models.User, user_id) is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        crud.rebuild_user_analysis(db=db, user_id=user_id)
+        return {"users_rebuilt": 1}
+    return {"users_rebuilt": crud.rebuild_all_user_analysis(db=db)}
+
+@app.post("/admin/population/refresh", response_model=schemas.PopulationRefreshResult)
+def refresh_population(
+    admin_user: schemas.User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Rebuilds the population histograms behind the analysis percentiles now,
+    instead of waiting for POPULATION_REFRESH_SECONDS to pass.
+    """
+    return {"users_counted": population.refresh_population(db)}
+
+
+@app.get("/admin/db-pool")
+def read_db_pool_status(admin_user: schemas.User = Depends(get_current_admin_user)):
+    """
+    Reports connection pool usage and settings, for sizing workers against DB connection limits.
+    """
+    return database.pool_status()
+
+
+@app.get("/admin/password-hashing")
+def read_password_hashing_stats(admin_user: schemas.User = Depends(get_current_admin_user)):
+    """
+    Reports the password hashing pool's queue depth and counters.
     """
-    analysis = crud.analyze_user_games(db=db, user_id=current_user.id)
-    return analysis
\ No newline at end of file
+    return security.hashing_stats()
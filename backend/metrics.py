@@ -0,0 +1,150 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Metrics ---
+# A minimal Prometheus text-format exporter: latency histograms for requests
+# and named spans (DB access, PGN replay, AI calls), plus gauges read from
+# callbacks when /metrics is scraped.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            pairs = list(zip(self.label_names, label_values))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(pairs, le=bound)} {count}")
+            lines.append(f'{self.name}_bucket{_format_labels(pairs, le="+Inf")} {series[-1]}')
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {series[-1]}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs, le=None) -> str:
+    pairs = list(pairs)
+    if le is not None:
+        pairs.append(("le", le))
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests.", ("method", "route", "status")
+)
+SPAN_LATENCY = Histogram(
+    "span_duration_seconds", "Time spent in named stages (DB access, PGN replay, AI calls).", ("span",)
+)
+
+# Callbacks returning [(metric_name, help_text, value), ...], read at scrape time.
+# A tuple may add a fourth item, the Prometheus type ("counter"); the default is "gauge".
+_gauge_collectors = []
+
+
+def register_gauges(collector):
+    """Adds a callback whose gauges are included in every /metrics scrape."""
+    _gauge_collectors.append(collector)
+
+
+@contextmanager
+def span(name: str):
+    """Times the enclosed block into span_duration_seconds{span=name}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_LATENCY.observe(time.perf_counter() - start, name)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = REQUEST_LATENCY.render() + SPAN_LATENCY.render()
+    for collector in _gauge_collectors:
+        try:
+            gauges = collector()
+        except Exception as e:
+            print(f"Metrics Error: {e}")
+            continue
+        for name, help_text, value, *metric_type in gauges:
+            metric_type = metric_type[0] if metric_type else "gauge"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+# --- Opt-in Profiler ---
+# Set ANALYSIS_PROFILE_SAMPLE_RATE (0-1) to cProfile that fraction of analysis
+# requests; stats files land in ANALYSIS_PROFILE_DIR for `python -m pstats`.
+ANALYSIS_PROFILE_SAMPLE_RATE = float(os.getenv("ANALYSIS_PROFILE_SAMPLE_RATE", 0))
+ANALYSIS_PROFILE_DIR = os.getenv("ANALYSIS_PROFILE_DIR", "profiles")
+# One profile at a time: since Python 3.12 cProfile is process-wide, so a second
+# enable() raises ValueError and a profile also records the other threads' work
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def maybe_profile(name: str):
+    """
+    Profiles the enclosed block for a sampled fraction of calls; a no-op by default.
+    A sampled call is skipped if another profile is already running.
+    """
+    if ANALYSIS_PROFILE_SAMPLE_RATE <= 0 or random.random() >= ANALYSIS_PROFILE_SAMPLE_RATE:
+        yield
+        return
+    if not _profile_lock.acquire(blocking=False):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Some other profiler (e.g. a debugger) owns the hook
+        _profile_lock.release()
+        profiler = None
+    if profiler is None:
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+        os.makedirs(ANALYSIS_PROFILE_DIR, exist_ok=True)
+        path = os.path.join(ANALYSIS_PROFILE_DIR, f"{name}-{int(time.time() * 1000)}.prof")
+        profiler.dump_stats(path)
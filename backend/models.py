@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, Text, Float, JSON, Date, DateTime, LargeBinary, ForeignKey, Index
 from sqlalchemy.orm import relationship, declarative_base
 
 # Create a base class for our models
@@ -16,14 +16,115 @@ class User(Base):
     # Define the relationship to the Game model
     # 'back_populates' links this relationship to the one in the Game model
     games = relationship("Game", back_populates="player")
+    # One-to-one link to the user's running analysis totals
+    analysis = relationship("UserAnalysis", back_populates="user", uselist=False)
 
 class Game(Base):
     __tablename__ = "games" # The actual table name
+    __table_args__ = (
+        # Serves "this user's games after id X" (keyset pagination) from the index alone
+        Index("ix_games_user_id_id", "user_id", "id"),
+        # One row per distinct game per user; duplicates are caught with a single probe
+        Index("ux_games_user_id_content_hash", "user_id", "content_hash", unique=True),
+    )
 
     # Define columns
     id = Column(Integer, primary_key=True, index=True)
     pgn_moves = Column(Text, nullable=False) # Store the PGN move list (can be long)
+    # Compact form written at ingest (see move_codec.py): 2 bytes per ply,
+    # replayed with board.push() without going through the PGN parser
+    moves_packed = Column(LargeBinary, nullable=True)
+    start_fen = Column(String(100), nullable=True) # Only set for games not starting from the initial position
+    white_player = Column(String(100), nullable=True, index=True)
+    black_player = Column(String(100), nullable=True, index=True)
+    result = Column(String(7), nullable=True, index=True) # "1-0", "0-1" or "1/2-1/2"
+    # sha256 of the normalized move sequence (see move_codec.content_hash); NULL until backfilled
+    content_hash = Column(String(64), nullable=True)
+    # When the game was played: the PGN date if it has a full one, otherwise when it was saved.
+    # Both are NULL for games saved before timestamps existed.
+    played_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False) # Foreign key linking to the users table
 
     # Define the relationship back to the User model
-    player = relationship("User", back_populates="games")
\ No newline at end of file
+    player = relationship("User", back_populates="games")
+    # Per-game counts extracted once when the game is saved
+    features = relationship("GameFeatures", back_populates="game", uselist=False)
+
+class GameFeatures(Base):
+    __tablename__ = "game_features" # One row per game, filled in at ingest
+
+    # Compact columns that scoring can aggregate in SQL
+    # instead of replaying the PGN on every analysis pass.
+    game_id = Column(Integer, ForeignKey("games.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True) # Denormalized for per-user aggregates
+    ply_count = Column(Integer, nullable=False, default=0)
+    captures = Column(Integer, nullable=False, default=0)
+    checks = Column(Integer, nullable=False, default=0)
+    castles = Column(Integer, nullable=False, default=0)
+    white_castling = Column(String(9), nullable=True) # "kingside", "queenside" or NULL
+    black_castling = Column(String(9), nullable=True)
+    first_move_san = Column(String(8), nullable=True)
+    opening_eco = Column(String(3), nullable=True, index=True) # e.g. "C65", from data/eco.tsv
+    opening_name = Column(String(128), nullable=True)
+
+    # Define the relationship back to the Game model
+    game = relationship("Game", back_populates="features")
+
+class GamePosition(Base):
+    __tablename__ = "game_positions" # One row per position (ply) of each game, filled in at ingest
+    __table_args__ = (
+        # "Which of this user's games reached position X", answered from the index alone
+        Index("ix_game_positions_user_id_zobrist", "user_id", "zobrist", "game_id"),
+    )
+
+    game_id = Column(Integer, ForeignKey("games.id"), primary_key=True)
+    ply = Column(SmallInteger, primary_key=True) # 0 = start position
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False) # Denormalized for the per-user lookup
+    zobrist = Column(BigInteger, nullable=False) # Signed 64-bit polyglot key, see positions.py
+
+class GameRollup(Base):
+    __tablename__ = "game_rollups" # Per-user sums of the game features per day and per week
+
+    # Updated as games are saved, so trends read a handful of rows instead of the history
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    period = Column(String(4), primary_key=True) # "day" or "week"
+    bucket_start = Column(Date, primary_key=True) # The day, or the Monday of the week
+    games = Column(Integer, nullable=False, default=0)
+    captures = Column(Integer, nullable=False, default=0)
+    checks = Column(Integer, nullable=False, default=0)
+    castles = Column(Integer, nullable=False, default=0)
+
+class UserAnalysis(Base):
+    __tablename__ = "user_analysis" # Running per-user analysis totals
+
+    # Updated every time a game is saved, so the analysis endpoint
+    # never has to replay the user's whole history.
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_games = Column(Integer, nullable=False, default=0)
+    aggressive_score = Column(Float, nullable=False, default=0)
+    defensive_score = Column(Float, nullable=False, default=0)
+    opening_counts = Column(JSON, nullable=False, default=dict) # {first move SAN: count}
+    opening_name_counts = Column(JSON, nullable=False, default=dict) # {ECO opening name, or first move if unnamed: count}
+
+    # Define the relationship back to the User model
+    user = relationship("User", back_populates="analysis")
+
+
+class PopulationHistogram(Base):
+    __tablename__ = "population_histograms" # One row per metric, rebuilt by population.refresh_population
+
+    metric = Column(String(32), primary_key=True) # e.g. "aggressive_per_game"
+    bin_width = Column(Float, nullable=False)
+    counts = Column(JSON, nullable=False) # Users per bin; the last bin also holds everything above it
+    updated_at = Column(DateTime, nullable=False)
+
+
+class ProfileCacheEntry(Base):
+    __tablename__ = "profile_cache" # Cached AI profiles (used by the "database" cache backend)
+
+    key = Column(String(64), primary_key=True) # sha256 of the prompt inputs
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True) # Lets a new game invalidate the entry
+    report = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False) # For the TTL
+    last_used_at = Column(DateTime, nullable=False, index=True) # For LRU eviction
@@ -0,0 +1,106 @@
+import hashlib
+import sys
+from array import array
+from datetime import datetime
+import chess
+
+# --- Compact Move Encoding ---
+# Each move is packed into 16 bits: from-square (6 bits), to-square (6 bits)
+# and promotion piece type (3 bits, 0 = none). A game is the little-endian
+# byte string of those codes, about 2 bytes per ply instead of ~5-6 for SAN text,
+# and decoding it needs no SAN parsing at all.
+
+# Header fields copied into their own indexed columns on models.Game
+HEADER_COLUMNS = {"White": "white_player", "Black": "black_player", "Result": "result"}
+RESULTS = ("1-0", "0-1", "1/2-1/2")
+
+
+def encode_move(move: chess.Move) -> int:
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code: int) -> chess.Move:
+    promotion = (code >> 12) & 0x7
+    return chess.Move(code & 0x3F, (code >> 6) & 0x3F, promotion or None)
+
+
+def encode_moves(moves) -> bytes:
+    """Packs an iterable of chess.Move into bytes."""
+    codes = array("H", (encode_move(move) for move in moves))
+    if sys.byteorder == "big":
+        codes.byteswap() # Always store little-endian
+    return codes.tobytes()
+
+
+def decode_moves(packed: bytes) -> list:
+    """Unpacks bytes from encode_moves back into a list of chess.Move."""
+    codes = array("H")
+    codes.frombytes(packed)
+    if sys.byteorder == "big":
+        codes.byteswap()
+    return [decode_move(code) for code in codes]
+
+
+def game_columns(game_data) -> dict:
+    """
+    The compact columns stored on models.Game for a parsed game:
+    packed moves, the start position (only if it isn't the standard one), header fields
+    and the date played.
+    """
+    columns = {"moves_packed": None, "start_fen": None, "content_hash": None, "played_at": None}
+    columns.update({column: None for column in HEADER_COLUMNS.values()})
+    if game_data is None:
+        return columns
+
+    columns["moves_packed"] = encode_moves(game_data.mainline_moves())
+    fen = game_data.board().fen()
+    if fen != chess.STARTING_FEN:
+        columns["start_fen"] = fen
+    for header, column in HEADER_COLUMNS.items():
+        value = game_data.headers.get(header)
+        # Skip the "?" / "*" placeholders python-chess fills in
+        if value and value not in ("?", "*"):
+            columns[column] = value[:100]
+    if columns["result"] not in RESULTS:
+        columns["result"] = None
+    columns["played_at"] = header_datetime(game_data.headers)
+    # A game with no moves says nothing about which game it is; callers fall back to pgn_text_hash
+    if columns["moves_packed"]:
+        columns["content_hash"] = content_hash(columns["moves_packed"], columns["start_fen"])
+    return columns
+
+
+def header_datetime(headers):
+    """When the game was played, from UTCDate/UTCTime or Date; None if missing or partial ("2024.??.??")."""
+    date = headers.get("UTCDate") or headers.get("Date")
+    try:
+        played_at = datetime.strptime(date, "%Y.%m.%d")
+    except (TypeError, ValueError):
+        return None
+    if headers.get("UTCDate"):
+        try:
+            clock = datetime.strptime(headers.get("UTCTime"), "%H:%M:%S")
+            played_at = played_at.replace(hour=clock.hour, minute=clock.minute, second=clock.second)
+        except (TypeError, ValueError):
+            pass
+    return played_at
+
+
+def content_hash(moves_packed: bytes, start_fen: str = None) -> str:
+    """
+    Identifies a game by its start position and move sequence only, so the same
+    game resubmitted with different headers, comments or spacing hashes the same.
+    """
+    digest = hashlib.sha256((start_fen or "").encode())
+    digest.update(b"\0")
+    digest.update(moves_packed or b"")
+    return digest.hexdigest()
+
+
+def pgn_text_hash(pgn_text: str) -> str:
+    """Fallback for PGN that doesn't parse: the hash of its whitespace-normalized text."""
+    return hashlib.sha256(("raw\0" + " ".join(pgn_text.split())).encode()).hexdigest()
+
+
+def start_board(start_fen: str = None) -> chess.Board:
+    return chess.Board(start_fen) if start_fen else chess.Board()
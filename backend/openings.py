@@ -0,0 +1,71 @@
+import os
+import threading
+import chess
+
+# --- ECO Opening Classifier ---
+# The bundled ECO table (data/eco.tsv) is turned into a trie keyed by moves.
+# Classifying a game walks its moves down the trie once, so it costs O(plies)
+# and stops as soon as the game leaves known theory.
+ECO_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "eco.tsv")
+
+
+class _Node:
+    __slots__ = ("children", "eco", "name")
+
+    def __init__(self):
+        self.children = {} # chess.Move -> _Node
+        self.eco = None
+        self.name = None
+
+
+_trie = None
+_trie_lock = threading.Lock()
+
+
+def _build_trie(path: str) -> _Node:
+    """Parses the ECO table (eco, name, SAN moves) into a move trie."""
+    root = _Node()
+    with open(path, encoding="utf-8") as table:
+        next(table) # Skip the header row
+        for line in table:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            eco, name, moves = line.split("\t")
+            board = chess.Board()
+            node = root
+            for token in moves.split():
+                if token.endswith("."):
+                    continue # Move number
+                move = board.push_san(token)
+                node = node.children.setdefault(move, _Node())
+            node.eco = eco
+            node.name = name
+    return root
+
+
+def get_trie() -> _Node:
+    """Builds the trie on first use and keeps it for the life of the process."""
+    global _trie
+    if _trie is None:
+        with _trie_lock:
+            if _trie is None:
+                _trie = _build_trie(ECO_TABLE_PATH)
+    return _trie
+
+
+def classify_moves(moves) -> tuple:
+    """
+    Returns (eco, name) of the deepest named opening these moves pass through,
+    or (None, None) if the game leaves theory before reaching one.
+    `moves` is any iterable of chess.Move from the standard starting position.
+    """
+    node = get_trie()
+    eco, name = None, None
+    for move in moves:
+        node = node.children.get(move)
+        if node is None:
+            break
+        if node.name:
+            eco, name = node.eco, node.name
+    return eco, name
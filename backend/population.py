@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from sqlalchemy import Integer, cast, func
+from sqlalchemy.exc import IntegrityError
+import database
+import models
+
+load_dotenv()
+
+# --- Population Percentiles ---
+# Where a user's per-game scores sit among all players. Each metric is kept as
+# a fixed-bin histogram of users (NUM_BINS counts, a compact quantile sketch)
+# in population_histograms. It is rebuilt from user_analysis with one GROUP BY,
+# never from the games themselves, and cached in-process. Between refreshes
+# the in-process copy is adjusted as this worker saves games.
+POPULATION_REFRESH_SECONDS = int(os.getenv("POPULATION_REFRESH_SECONDS", 300))
+NUM_BINS = 200
+
+# metric -> (bin width, UserAnalysis total it is computed from)
+METRICS = {
+    "aggressive_per_game": (0.1, models.UserAnalysis.aggressive_score), # bins cover 0-20
+    "defensive_per_game": (0.01, models.UserAnalysis.defensive_score), # bins cover 0-2
+}
+
+_histograms = {} # metric -> list of NUM_BINS counts
+_loaded_at = None # time.monotonic() of the last load or refresh
+_lock = threading.Lock()
+# Single-flight for loads/rebuilds, so concurrent requests run the GROUP BY once
+_refresh_lock = threading.Lock()
+
+
+def per_game_values(total_games: int, aggressive_score: float, defensive_score: float):
+    """A user's scores normalized per game, or None for users without games."""
+    if not total_games:
+        return None
+    return {
+        "aggressive_per_game": aggressive_score / total_games,
+        "defensive_per_game": defensive_score / total_games,
+    }
+
+
+def _bin(metric: str, value: float) -> int:
+    return max(0, min(NUM_BINS - 1, int(value / METRICS[metric][0])))
+
+
+def refresh_population(db) -> int:
+    """Rebuilds and stores every metric's histogram; returns the number of users counted."""
+    with _refresh_lock:
+        return _refresh_population(db)
+
+
+def _refresh_population(db) -> int:
+    # Callers hold _refresh_lock
+    insert = database.dialect_insert(db)
+    histograms = {}
+    for metric, (width, score_column) in METRICS.items():
+        counts = [0] * NUM_BINS
+        rows = (
+            db.query(
+                # floor() rounds down like _bin(); a bare CAST rounds on PostgreSQL
+                cast(func.floor(score_column / models.UserAnalysis.total_games / width), Integer).label("bin"),
+                func.count(),
+            )
+            .filter(models.UserAnalysis.total_games > 0)
+            .group_by("bin")
+            .all()
+        )
+        for index, count in rows:
+            counts[max(0, min(NUM_BINS - 1, index))] += count
+        histograms[metric] = counts
+        values = {
+            "bin_width": width,
+            "counts": counts,
+            "updated_at": datetime.now(timezone.utc).replace(tzinfo=None),
+        }
+        # Upsert, since another worker may store the same metric at the same time
+        db.execute(
+            insert(models.PopulationHistogram)
+            .values(metric=metric, **values)
+            .on_conflict_do_update(index_elements=["metric"], set_=values)
+        )
+    db.commit()
+    _set_histograms(histograms)
+    return sum(histograms[next(iter(METRICS))])
+
+
+def _set_histograms(histograms: dict):
+    global _loaded_at
+    with _lock:
+        _histograms.clear()
+        _histograms.update(histograms)
+        _loaded_at = time.monotonic()
+
+
+def _ensure_fresh(db):
+    """
+    Reloads the stored histograms every POPULATION_REFRESH_SECONDS, and rebuilds
+    them first if no worker has done so within that time.
+    """
+    if _is_fresh():
+        return
+    # Only one request reloads; the others keep answering from the stale copy,
+    # or wait for the first load if there is none yet
+    if not _refresh_lock.acquire(blocking=_loaded_at is None):
+        return
+    try:
+        if _is_fresh():
+            return # Another request finished the reload while this one waited
+        rows = _stored_rows(db)
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=POPULATION_REFRESH_SECONDS)
+        if all(
+            metric in rows and rows[metric].bin_width == width and rows[metric].updated_at >= cutoff
+            for metric, (width, _) in METRICS.items()
+        ):
+            _set_histograms({metric: list(rows[metric].counts) for metric in METRICS})
+            return
+        try:
+            _refresh_population(db)
+        except IntegrityError as e:
+            # Lost a race with another worker's rebuild; use what it stored
+            print(f"Population refresh conflict: {e}")
+            db.rollback()
+            rows = _stored_rows(db)
+            if all(metric in rows for metric in METRICS):
+                _set_histograms({metric: list(rows[metric].counts) for metric in METRICS})
+    finally:
+        _refresh_lock.release()
+
+
+def _is_fresh() -> bool:
+    return _loaded_at is not None and time.monotonic() - _loaded_at < POPULATION_REFRESH_SECONDS
+
+
+def _stored_rows(db) -> dict:
+    return {row.metric: row for row in db.query(models.PopulationHistogram)}
+
+
+def record_change(before: dict, after: dict):
+    """
+    Moves one user between bins after their totals change.
+    `before`/`after` are per_game_values() results (None = not counted).
+    """
+    with _lock:
+        if not _histograms:
+            return
+        for metric in METRICS:
+            if before is not None:
+                index = _bin(metric, before[metric])
+                _histograms[metric][index] = max(0, _histograms[metric][index] - 1)
+            if after is not None:
+                _histograms[metric][_bin(metric, after[metric])] += 1
+
+
+def percentiles(db, values: dict) -> dict:
+    """
+    metric -> share of players (0-100) with a lower per-game score, counting
+    half of the user's own bin. None for users without games or an empty population.
+    """
+    if values is None:
+        return {metric: None for metric in METRICS}
+    _ensure_fresh(db)
+    result = {}
+    with _lock:
+        for metric, value in values.items():
+            counts = _histograms.get(metric)
+            total = sum(counts) if counts else 0
+            if not total:
+                result[metric] = None
+                continue
+            index = _bin(metric, value)
+            below = sum(counts[:index]) + counts[index] / 2
+            result[metric] = round(100 * below / total, 1)
+    return result
@@ -0,0 +1,41 @@
+import chess
+import chess.pgn
+import chess.polyglot
+import move_codec
+
+# --- Position Index ---
+# Every position a game passes through is keyed by its polyglot Zobrist hash
+# (pieces, side to move, castling and en passant; not the move counters), so
+# "which of my games reached this position" is an index lookup on
+# models.GamePosition instead of a replay of every game.
+# The 64-bit keys are stored signed so they fit a BIGINT column.
+
+
+def zobrist_key(board: chess.Board) -> int:
+    """The board's polyglot Zobrist hash as a signed 64-bit integer."""
+    key = chess.polyglot.zobrist_hash(board)
+    return key - (1 << 64) if key >= (1 << 63) else key
+
+
+def fen_key(fen: str) -> int:
+    """Key for a FEN string; raises ValueError if the FEN is invalid."""
+    return zobrist_key(chess.Board(fen))
+
+
+def board_keys(board: chess.Board, moves) -> list:
+    """[(ply, key), ...] for the start position (ply 0) and the position after each move."""
+    keys = [(0, zobrist_key(board))]
+    for ply, move in enumerate(moves, start=1):
+        board.push(move)
+        keys.append((ply, zobrist_key(board)))
+    return keys
+
+
+def game_keys(game_data: chess.pgn.Game) -> list:
+    """Position keys of an already parsed game."""
+    return board_keys(game_data.board(), game_data.mainline_moves())
+
+
+def packed_keys(packed: bytes, start_fen: str = None) -> list:
+    """Same as game_keys, from move_codec's packed moves."""
+    return board_keys(move_codec.start_board(start_fen), move_codec.decode_moves(packed))
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from cachetools import TTLCache
+import models
+
+
+def make_cache_key(pgn_list: list, stats: dict) -> str:
+    """
+    Digest of everything that goes into the AI prompt.
+    Identical inputs always map to the same key, so identical prompts are only sent once.
+    """
+    payload = json.dumps({"stats": stats, "pgns": list(pgn_list)}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryProfileCache:
+    """
+    In-process cache with a size bound, LRU eviction and a TTL.
+    Fast, but each worker process keeps its own copy.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: int = 3600):
+        self._entries = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, report: str, user_id: int = None):
+        with self._lock:
+            self._entries[key] = report
+            if user_id is not None:
+                self._keys_by_user.setdefault(user_id, set()).add(key)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in self._keys_by_user.pop(user_id, set()):
+                self._entries.pop(key, None)
+
+
+class DatabaseProfileCache:
+    """
+    Cache stored in the profile_cache table, shared by every worker process.
+    `session_factory` is a sessionmaker (e.g. main.SessionLocal).
+    """
+
+    def __init__(self, session_factory, max_entries: int = 10000, ttl_seconds: int = 3600):
+        self._session_factory = session_factory
+        self.max_entries = max_entries
+        self.ttl = timedelta(seconds=ttl_seconds)
+
+    def get(self, key: str):
+        db = self._session_factory()
+        try:
+            entry = db.get(models.ProfileCacheEntry, key)
+            if entry is None:
+                return None
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            if entry.created_at + self.ttl < now:
+                db.delete(entry)
+                db.commit()
+                return None
+            # Touch the entry so LRU eviction keeps it
+            entry.last_used_at = now
+            db.commit()
+            return entry.report
+        finally:
+            db.close()
+
+    def set(self, key: str, report: str, user_id: int = None):
+        db = self._session_factory()
+        try:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            db.merge(models.ProfileCacheEntry(
+                key=key, user_id=user_id, report=report, created_at=now, last_used_at=now
+            ))
+            db.commit()
+            self._evict(db)
+        finally:
+            db.close()
+
+    def invalidate_user(self, user_id: int):
+        db = self._session_factory()
+        try:
+            db.query(models.ProfileCacheEntry).filter(
+                models.ProfileCacheEntry.user_id == user_id
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _evict(self, db):
+        """Drops the least recently used entries beyond max_entries."""
+        count = db.query(models.ProfileCacheEntry).count()
+        if count <= self.max_entries:
+            return
+        stale_keys = [
+            row.key for row in db.query(models.ProfileCacheEntry.key)
+            .order_by(models.ProfileCacheEntry.last_used_at)
+            .limit(count - self.max_entries)
+        ]
+        db.query(models.ProfileCacheEntry).filter(
+            models.ProfileCacheEntry.key.in_(stale_keys)
+        ).delete(synchronize_session=False)
+        db.commit()
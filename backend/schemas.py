@@ -1,5 +1,6 @@
 from pydantic import BaseModel, ConfigDict, Field
-from typing import List, Optional
+from datetime import date, datetime
+from typing import Dict, List, Optional
 
 # --- Game Schemas ---
 class GameBase(BaseModel):
@@ -11,9 +12,41 @@ class GameCreate(GameBase):
 class Game(GameBase):
     id: int
     user_id: int
+    played_at: Optional[datetime] = None # PGN date if complete, else when it was saved
 
     model_config = ConfigDict(from_attributes=True) # Enable ORM mode
 
+class GameSummary(BaseModel):
+    """
+    Lightweight view of a game for listings; leaves out the PGN text.
+    """
+    id: int
+    user_id: int
+    ply_count: Optional[int] = None
+    first_move_san: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True) # Enable ORM mode
+
+class PositionMatch(BaseModel):
+    """
+    A game that reached the searched position, and at which plies (0 = start position).
+    """
+    game_id: int
+    plies: List[int]
+    white_player: Optional[str] = None
+    black_player: Optional[str] = None
+    result: Optional[str] = None
+
+class GameImportResult(BaseModel):
+    """
+    Summary of a bulk import: how many games were saved, skipped as duplicates
+    or rejected, and why.
+    """
+    accepted: int
+    rejected: int
+    duplicates: int = 0 # Games this user had already saved, skipped
+    errors: List[str] = [] # The first few rejection reasons
+
 # --- User Schemas ---
 class UserBase(BaseModel):
     username: str
@@ -24,7 +57,7 @@ class UserCreate(UserBase):
 
 class User(UserBase):
     id: int
-    games: List[Game] = [] # A list to hold the user's games
+    # Games are no longer embedded here; page through them with GET /games/
 
     model_config = ConfigDict(from_attributes=True) # Enable ORM mode
 
@@ -45,9 +78,51 @@ class AnalysisResult(BaseModel):
     total_games: int
     aggressive_score: int
     defensive_score: int
+    # Share of players (0-100) with lower per-game scores; None until there is a population
+    aggressive_percentile: Optional[float] = None
+    defensive_percentile: Optional[float] = None
     opening_preference: Optional[str] = None
+    opening_distribution: Dict[str, int] = {} # Named opening (first move if unnamed) -> number of games
     personality_type: str
     celebrity_match: str
     ai_report: str
+    ai_report_status: str = "done" # "pending"/"running" while the AI job is still working
+    ai_report_job_id: Optional[str] = None # Poll /users/me/analysis/jobs/{id} when set
+
+    model_config = ConfigDict(from_attributes=True) # Enable ORM mode
 
-    model_config = ConfigDict(from_attributes=True) # Enable ORM mode
\ No newline at end of file
+class TrendPoint(BaseModel):
+    """
+    Per-game scores for one day or week.
+    """
+    period_start: date
+    games: int
+    aggressive_per_game: float
+    defensive_per_game: float
+
+class TrendResult(BaseModel):
+    """
+    How a user's scores moved over their most recent days or weeks, oldest first.
+    """
+    period: str # "day" or "week"
+    points: List[TrendPoint]
+
+class AnalysisJob(BaseModel):
+    """
+    Status of a background AI profile job.
+    """
+    job_id: str
+    status: str # "pending", "running", "done" or "failed"
+    ai_report: Optional[str] = None
+
+class AnalysisRebuildResult(BaseModel):
+    """
+    Returned by the admin endpoint that recomputes stored analysis totals.
+    """
+    users_rebuilt: int
+
+class PopulationRefreshResult(BaseModel):
+    """
+    Returned by the admin endpoint that rebuilds the population percentile histograms.
+    """
+    users_counted: int
@@ -1,4 +1,9 @@
+import asyncio
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from passlib.context import CryptContext
@@ -8,16 +13,119 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # --- Password Hashing ---
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+# PASSWORD_HASH_ROUNDS sets the sha256_crypt cost. Hashes made with a different
+# cost are flagged by verify_and_update and transparently rehashed on login.
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 535000)) # passlib's default
+pwd_context = CryptContext(
+    schemes=["sha256_crypt"],
+    deprecated="auto",
+    sha256_crypt__default_rounds=PASSWORD_HASH_ROUNDS,
+    sha256_crypt__min_rounds=PASSWORD_HASH_ROUNDS,
+    sha256_crypt__max_rounds=PASSWORD_HASH_ROUNDS,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Checks if the plain password matches the stored hash."""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """
+    Checks the password and returns (matches, new_hash).
+    new_hash is set when the stored hash uses outdated parameters and should be replaced.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password: str) -> str:
     """Generates a hash for the given plain password."""
     return pwd_context.hash(password)
 
+# --- Hashing Worker Pool ---
+# Hashing takes tens of milliseconds of CPU, so async routes hand it to this
+# small pool instead of running it on the event loop. At most
+# PASSWORD_HASH_MAX_PENDING calls may be running or queued; beyond that we
+# reject quickly (HashingOverloaded) rather than let a login storm pile up.
+# The default "process" pool sidesteps the GIL, which crypt() holds while hashing;
+# "thread" avoids the extra processes where that matters more.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "process")
+
+class HashingOverloaded(Exception):
+    """Raised when too many hashing calls are already waiting, or the pool can't be used."""
+
+_hash_executor = None
+_hash_lock = threading.Lock()
+_hash_stats = {"pending": 0, "completed": 0, "rejected": 0}
+
+def _get_hash_executor():
+    """Creates the hashing pool on first use."""
+    global _hash_executor
+    with _hash_lock:
+        if _hash_executor is None:
+            if PASSWORD_HASH_EXECUTOR == "thread":
+                _hash_executor = ThreadPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+                )
+            else:
+                # "spawn" avoids forking a process that already runs server threads
+                _hash_executor = ProcessPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return _hash_executor
+
+def _drop_hash_executor(executor):
+    """Forgets a broken pool, so the next call builds a fresh one."""
+    global _hash_executor
+    with _hash_lock:
+        # Another call may already have replaced it
+        if _hash_executor is executor:
+            _hash_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+async def _run_hashing(fn, *args):
+    """
+    Runs a hashing function on the pool, enforcing the pending-call cap.
+    If a worker process dies, the pool is replaced and the call retried once.
+    """
+    with _hash_lock:
+        if _hash_stats["pending"] >= PASSWORD_HASH_MAX_PENDING:
+            _hash_stats["rejected"] += 1
+            raise HashingOverloaded()
+        _hash_stats["pending"] += 1
+    try:
+        for _ in range(2):
+            executor = _get_hash_executor()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+            except BrokenProcessPool as e:
+                # A worker was killed (OOM, signal) and took the whole pool with it
+                print(f"Hashing Pool Error: {e}")
+                _drop_hash_executor(executor)
+        raise HashingOverloaded()
+    finally:
+        with _hash_lock:
+            _hash_stats["pending"] -= 1
+            _hash_stats["completed"] += 1
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    """verify_and_update_password on the hashing pool."""
+    return await _run_hashing(verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the hashing pool."""
+    return await _run_hashing(get_password_hash, password)
+
+def hashing_stats() -> dict:
+    """Queue depth and counters for the hashing pool."""
+    with _hash_lock:
+        stats = dict(_hash_stats)
+    # Calls beyond the worker count are waiting in the executor's queue
+    stats["queued"] = max(0, stats["pending"] - PASSWORD_HASH_WORKERS)
+    stats["workers"] = PASSWORD_HASH_WORKERS
+    stats["max_pending"] = PASSWORD_HASH_MAX_PENDING
+    return stats
+
 # --- JWT Token Handling ---
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256") # Default algorithm if not set
@@ -0,0 +1,56 @@
+import threading
+
+# --- Single-Flight ---
+# Concurrent calls with the same key share one execution: the first caller
+# runs the function, the rest wait for it and get the same result (or error).
+# In-process only; each worker process has its own flights.
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls. Counts executed vs. coalesced calls for /metrics."""
+
+    def __init__(self):
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {} # key -> _Call still in flight
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs), unless a call with this key is already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # Later callers start a fresh flight rather than reuse this result
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
@@ -0,0 +1,115 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import Session
+import analysis
+import database
+import models
+
+# --- Trend Rollups ---
+# Each saved game adds its counts to the user's day and week rows in
+# game_rollups, so a trend over recent weeks (or games) reads only those rows.
+# Games without a timestamp (saved before played_at existed) aren't in any bucket.
+PERIODS = ("day", "week")
+
+
+def bucket_start(played_at: datetime, period: str) -> date:
+    """The day, or the Monday of the week, that `played_at` falls in."""
+    day = played_at.date()
+    return day - timedelta(days=day.weekday()) if period == "week" else day
+
+
+def add_to_rollups(db: Session, user_id: int, items: list):
+    """
+    Adds [(played_at, features), ...] to the user's rollup rows.
+    Does not commit; the caller owns the transaction.
+    """
+    sums = {} # (period, bucket_start) -> [games, captures, checks, castles]
+    for played_at, features in items:
+        if played_at is None:
+            continue
+        for period in PERIODS:
+            bucket = sums.setdefault((period, bucket_start(played_at, period)), [0, 0, 0, 0])
+            bucket[0] += 1
+            bucket[1] += features["captures"]
+            bucket[2] += features["checks"]
+            bucket[3] += features["castles"]
+    if not sums:
+        return
+
+    # One upsert adds to existing buckets and creates missing ones atomically, so
+    # concurrent saves into a new bucket don't collide on the primary key.
+    # Sorted so concurrent transactions lock the rows in the same order.
+    stmt = database.dialect_insert(db)(models.GameRollup).values([
+        {
+            "user_id": user_id,
+            "period": period,
+            "bucket_start": bucket,
+            "games": games,
+            "captures": captures,
+            "checks": checks,
+            "castles": castles,
+        }
+        for (period, bucket), (games, captures, checks, castles) in sorted(sums.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["user_id", "period", "bucket_start"],
+        set_={
+            column: getattr(models.GameRollup, column) + getattr(stmt.excluded, column)
+            for column in ("games", "captures", "checks", "castles")
+        },
+    ))
+
+
+def rebuild_rollups(db: Session, user_id: int, chunk_size: int = 1000):
+    """Recomputes a user's rollups from their stored game features. Does not commit."""
+    db.query(models.GameRollup).filter(models.GameRollup.user_id == user_id).delete()
+    db.flush()
+    rows = (
+        db.query(
+            models.Game.played_at,
+            models.GameFeatures.captures,
+            models.GameFeatures.checks,
+            models.GameFeatures.castles,
+        )
+        .join(models.GameFeatures)
+        .filter(models.Game.user_id == user_id, models.Game.played_at.isnot(None))
+        .all()
+    )
+    for i in range(0, len(rows), chunk_size):
+        add_to_rollups(db, user_id, [
+            (played_at, {"captures": captures, "checks": checks, "castles": castles})
+            for played_at, captures, checks, castles in rows[i:i + chunk_size]
+        ])
+    db.flush()
+
+
+def get_trend(db: Session, user_id: int, period: str, limit: int, games: int = None) -> list:
+    """
+    The user's most recent non-empty buckets, oldest first, as dicts of per-game scores.
+    Returns the last `limit` buckets, or with `games` set, as many recent buckets as it
+    takes to cover at least that many games.
+    """
+    query = (
+        db.query(models.GameRollup)
+        .filter(models.GameRollup.user_id == user_id, models.GameRollup.period == period)
+        .order_by(models.GameRollup.bucket_start.desc())
+    )
+    if games is None:
+        rows = query.limit(limit).all()
+    else:
+        rows = []
+        covered = 0
+        for row in query.yield_per(100):
+            rows.append(row)
+            covered += row.games
+            if covered >= games:
+                break
+
+    return [
+        {
+            "period_start": row.bucket_start,
+            "games": row.games,
+            "aggressive_per_game": round(analysis.aggressive_score(row.captures, row.checks) / row.games, 2),
+            "defensive_per_game": round(analysis.defensive_score(row.castles) / row.games, 2),
+        }
+        for row in reversed(rows)
+    ]
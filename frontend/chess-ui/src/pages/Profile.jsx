@@ -2,6 +2,9 @@ import { useEffect, useState } from "react";
 import axios from "axios";
 import { useNavigate } from "react-router-dom"; // Import Hook
 
+// About two minutes of polling for the AI report before giving up
+const MAX_REPORT_POLLS = 60;
+
 function Profile() {
   const [profile, setProfile] = useState(null);
   const [games, setGames] = useState([]);
@@ -20,6 +23,41 @@ function Profile() {
   }
 
   useEffect(() => {
+    let cancelled = false; // Set on unmount so the report poll stops
+
+    // Polls the background AI report job. Problems here only affect the report;
+    // the stats and games already on screen stay there.
+    const pollReport = async (jobId, config) => {
+      for (let attempt = 0; jobId && attempt < MAX_REPORT_POLLS; attempt++) {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        if (cancelled) return;
+        try {
+          const jobRes = await axios.get(`https://chess-backend-u4wt.onrender.com/users/me/analysis/jobs/${jobId}`, config);
+          if (cancelled) return;
+          if (jobRes.data.status === "done" || jobRes.data.status === "failed") {
+            setAnalysis((prev) => ({ ...prev, ai_report: jobRes.data.ai_report, ai_report_status: jobRes.data.status }));
+            return;
+          }
+        } catch (err) {
+          console.error(err);
+          if (err.response?.status !== 404) continue; // Network blip: try again next tick
+          // Jobs live in one server process, so this one expired or belongs to another
+          // worker. Ask again: a finished report comes from the cache, else a new job starts.
+          try {
+            const analysisRes = await axios.get("https://chess-backend-u4wt.onrender.com/users/me/analysis", config);
+            if (cancelled) return;
+            setAnalysis(analysisRes.data);
+            jobId = analysisRes.data.ai_report_job_id;
+          } catch (retryErr) {
+            console.error(retryErr);
+          }
+        }
+      }
+      if (jobId && !cancelled) {
+        setAnalysis((prev) => ({ ...prev, ai_report: "Could not generate profile at this time.", ai_report_status: "failed" }));
+      }
+    };
+
     const fetchData = async () => {
       const token = localStorage.getItem("chess_token");
       if (!token) {
@@ -37,13 +75,20 @@ function Profile() {
         const userRes = await axios.get("https://chess-backend-u4wt.onrender.com/users/me", config);
         setProfile(userRes.data);
 
-        // 2. Fetch User's Games
-        const gamesRes = await axios.get("https://chess-backend-u4wt.onrender.com/games/", config);
+        // 2. Fetch User's Games (most recent first)
+        const gamesRes = await axios.get("https://chess-backend-u4wt.onrender.com/games/", {
+          ...config,
+          params: { newest_first: true }
+        });
         setGames(gamesRes.data);
 
         // 3. Fetch Personality Analysis
         const analysisRes = await axios.get("https://chess-backend-u4wt.onrender.com/users/me/analysis", config);
         setAnalysis(analysisRes.data);
+        setLoading(false);
+
+        // 4. If the AI report is still being generated, poll its job
+        await pollReport(analysisRes.data.ai_report_job_id, config);
 
       } catch (err) {
         console.error(err);
@@ -54,6 +99,9 @@ function Profile() {
     };
 
     fetchData();
+    return () => {
+      cancelled = true;
+    };
   }, []);
 
   return (